@@ -1,8 +1,10 @@
 from flask import Flask, render_template, request, redirect, url_for
 import os
 import pandas as pd
-from main import main_ui_workflow
+from main import main_ui_workflow, warm_dq_master, wait_for_master_warmup, get_master_status
 from rules.logger import setup_logger, log_separator, log_file_operation, log_error, log_section_start, reset_log_file
+from rules.master_cache import invalidate_master_cache
+from rules.master_refresh import capture_master_state
 from code_comapre.compare_test import compare_for_ui
 import traceback
 
@@ -40,7 +42,7 @@ def landing():
     master_file = get_master_file_path()
     if master_file:
         filename = os.path.basename(master_file)
-        return render_template("choose_operation.html", filename=filename)
+        return render_template("choose_operation.html", filename=filename, master_status=get_master_status(master_file))
     else:
         # If no master file, show upload page
         return render_template("upload_master.html")
@@ -64,10 +66,18 @@ def upload_master():
         # Save the master file
         global DQ_MASTER_FILE
         DQ_MASTER_FILE = os.path.join(UPLOAD_FOLDER, "dq_rules_master.xlsx")
+        # Let a build of the previous upload finish before its file is replaced
+        wait_for_master_warmup(DQ_MASTER_FILE)
+        # Keep the previous master so unchanged sheets and rules can be carried over
+        previous_state = capture_master_state(DQ_MASTER_FILE)
+        invalidate_master_cache(DQ_MASTER_FILE)
         dq_file.save(DQ_MASTER_FILE)
         
         log_file_operation(logger, "Uploaded DQ Rules Master", DQ_MASTER_FILE)
         
+        # Parse in the background; add/update and configure submissions wait on this build
+        warm_dq_master(DQ_MASTER_FILE, previous_state)
+        
         logger.info("✅ DQ Rules Master file uploaded successfully")
         log_separator(logger, "=", 70)
         
@@ -89,7 +99,7 @@ def choose_operation():
         return redirect(url_for('upload_master'))
     
     filename = os.path.basename(master_file)
-    return render_template("choose_operation.html", filename=filename)
+    return render_template("choose_operation.html", filename=filename, master_status=get_master_status(master_file))
 
 @app.route("/add-update-rule", methods=["GET", "POST"])
 def add_update_rule():
@@ -19,7 +19,42 @@ HOST = "localhost"
 PORT = "5434"
 DB = "postgres"
 
-ENGINE = create_engine(f"postgresql+psycopg2://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB}")
+# Connection pool sizing; each workflow run holds one connection for its whole duration
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_WORKFLOW_ISOLATION_LEVEL = "REPEATABLE READ"
+
+# Configure tickets spanning several tenants prepare and write each tenant on its own thread (1 = sequential).
+# Every worker holds its own connection, so keep this within DB_POOL_SIZE + DB_MAX_OVERFLOW.
+CONFIGURE_TENANT_WORKERS = 4
+
+# New rule_id / rule_extn_id values are reserved through a local ledger so concurrent runs never hand out the same id.
+# Every reservation re-reads the database MAX(); unmerged changelog CSVs are always accounted for.
+ID_LEDGER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "id_ledger.json")
+# How long to wait before checking whether the lock holder is still running
+ID_LEDGER_LOCK_TIMEOUT_SECONDS = 30
+# A lock older than this is broken even if its holder still seems to be running
+ID_LEDGER_LOCK_STALE_SECONDS = 600
+
+# How add/update rules are prepared: "vectorized" (column-wise, for bulk tickets) or "rowwise" (one rule at a time)
+ADD_UPDATE_PREPARE_MODE = "vectorized"
+# "rowwise" only: look up and extract rules on this many threads (1 = one after another).
+# New rule_ids are still numbered in input order; each worker uses its own pooled connection.
+ADD_UPDATE_PREPARE_WORKERS = 1
+
+POSTGRES_URL = f"postgresql+psycopg2://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB}"
+
+# Run a workflow's independent lookups concurrently over an asyncpg pool instead of one after another
+# on the workflow connection. Postgres only, and needs `pip install asyncpg`; otherwise lookups stay sequential.
+DB_ASYNC_LOOKUPS = False
+DB_ASYNC_POOL_SIZE = 5
+ASYNC_POSTGRES_DSN = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB}"
+
+# "postgres": the live configdb above
+# "sqlite": a local snapshot of the configdb tables, one file per tenant schema in SQLITE_SNAPSHOT_DIR.
+#           Build it with: python -m rules.backend export
+DB_BACKEND = "postgres"
+SQLITE_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db_snapshot")
 
 
 TENANT_DEV_FILE_PATHS = {
@@ -34,5 +69,37 @@ TENANT_DATA_FOLDER_PATHS = {
     k: os.path.join(v, "data") for k, v in TENANT_DEV_FILE_PATHS.items()
 }
 
+if DB_BACKEND == "sqlite":
+    from rules.backend import create_sqlite_engine, configdb_schemas
+    ENGINE = create_sqlite_engine(SQLITE_SNAPSHOT_DIR, configdb_schemas(TENANT_DEV_FILE_PATHS))
+else:
+    ENGINE = create_engine(
+        POSTGRES_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True
+    )
+
 # Note: Sheet names are now auto-detected based on Rule IDs in the master file
-# No need for manual SHEET_NAME mapping anymore
\ No newline at end of file
+# No need for manual SHEET_NAME mapping anymore
+
+# DQ MASTER LOADING
+# Parse the master workbook sheets in this many worker processes (1 = parse in-process).
+# Starting the processes costs more than it saves on a typical master; only raise this for very large workbooks
+MASTER_PARSE_WORKERS = 1
+# Without a cached full master, parse only the sheets that hold the requested RuleIDs
+MASTER_LAZY_SHEETS = True
+# "memory": keep the consolidated master in process memory
+# "sqlite": materialize it into a local SQLite file and read only the requested rules per workflow
+MASTER_BACKEND = "memory"
+
+# CACHE SETTINGS
+# validation_rule_metadata is small and slow-changing; it is loaded once and reused until it expires
+METADATA_CACHE_TTL_SECONDS = 3600
+# Per-tenant reference tables (des_zone_table_list, pdm_entity_master, source tables) snapshot lifetime
+REFERENCE_CACHE_TTL_SECONDS = 900
+
+# TRACING
+# Time each workflow stage and rule; the summary is logged and written as JSON under TIMINGS_DIR
+TRACING_ENABLED = False
+TIMINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "timings")
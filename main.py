@@ -1,110 +1,165 @@
-import pandas as pd
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 
-from config import TENANT_DATA_FOLDER_PATHS, TENANT_DEV_FILE_PATHS, ENGINE
-from rules.helper import get_version_info, get_version_info_extn
+from config import TENANT_DATA_FOLDER_PATHS, TENANT_DEV_FILE_PATHS, ENGINE, CONFIGURE_TENANT_WORKERS, MASTER_PARSE_WORKERS, MASTER_LAZY_SHEETS, MASTER_BACKEND
+from rules.helper import get_version_info, get_version_info_extn, get_rule_index
 from rules.add_update import prepare_add_update_rules
-from rules.configure import prepare_configure_rules
+from rules.configure import prepare_configure_rules, prefetch_configure_lookups
 from rules.writers import write_csv, write_xml, update_dev_file, write_csv_extn, write_xml_extn
-from rules.logger import setup_logger, log_section_start, log_subsection, log_file_operation
+from rules.logger import setup_logger, log_section_start, log_subsection, log_file_operation, buffered_logs, flush_buffered_logs
+from rules.master_cache import load_cached_master, load_cached_rule_directory, is_master_cached
+from rules.master_loader import MASTER_SHEETS, load_master_sheets, build_rule_directory
+from rules.master_refresh import refresh_master
+from rules.enrichment import enrich_master
+from rules.master_store import open_master_store, is_master_stored
+from rules.session import workflow_session
+from rules.id_allocator import id_reservations
+from rules.tracing import trace_run, span, current_span, attach
 
 engine = ENGINE
 logger = setup_logger("main")
 
-def consolidate_dq_master_sheets(dq_file_path):
-    sheets_to_consolidate = [
-        'Provider Network',
-        'Practitioner', 
-        'Organization',
-        'Address',
-        'Network'
-    ]
-    
+# Uploads hand the master build to this worker; one build at a time, in upload order
+_WARM_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="master-warm")
+_WARM_JOBS = {}
+_WARM_LOCK = threading.Lock()
+
+def consolidate_dq_master_sheets(dq_file_path, sheets_to_consolidate=MASTER_SHEETS):
     logger.info(f"📚 Consolidating {len(sheets_to_consolidate)} sheets into single DataFrame...")
     
-    # Read all specified sheets
-    all_sheets = pd.read_excel(dq_file_path, sheet_name=sheets_to_consolidate)
-    
-    # Column name mappings to standardize
-    column_mappings = {
-        'Rule ID': 'RuleID',
-        'RuleID': 'RuleID',
-        'rule id': 'RuleID',
-        'ruleid': 'RuleID',
-        'Rule Type': 'RuleType',
-        'Rule type': 'RuleType',
-        'Rule Category': 'RuleType',
-        'rule type': 'RuleType',
-        'rule category': 'RuleType',
-        'Sub Entity': 'SubEntity',
-        'Sub-Entity': 'SubEntity',
-        'sub entity': 'SubEntity',
-        'sub-entity': 'SubEntity',
-        'Ingest+UI/UI Only': 'IngestUIOnly',
-        'Ingest+UI/Ui Only': 'IngestUIOnly',
-        'Ingest+UI/UI only': 'IngestUIOnly',
-        'ingest+ui/ui only': 'IngestUIOnly',
-        'Column Name': 'ColumnName',
-        'column name': 'ColumnName',
-        'Table Name': 'TableName',
-        'table name': 'TableName',
-        'Rule Name': 'RuleName',
-        'rule name': 'RuleName',
-        'Rule Description': 'RuleDescription',
-        'rule description': 'RuleDescription'
-    }
-    
-    consolidated_dfs = []
-    
-    for sheet_name, df in all_sheets.items():
-        # Create a copy to avoid modifying original
-        df_copy = df.copy()
-        
-        # Strip whitespace from column names first
-        df_copy.columns = [str(c).strip() for c in df_copy.columns]
-        
-        # Apply column name mappings (case-insensitive)
-        new_columns = []
-        for col in df_copy.columns:
-            # Check if column needs mapping
-            mapped_col = column_mappings.get(col, col)
-            new_columns.append(mapped_col)
-        
-        df_copy.columns = new_columns
-        
-        # Add source sheet as a column for reference
-        df_copy['SourceSheet'] = sheet_name
-        
-        consolidated_dfs.append(df_copy)
-        logger.info(f"  ✓ {sheet_name}: {len(df_copy)} rules")
-    
-    # Concatenate all dataframes
-    consolidated_df = pd.concat(consolidated_dfs, ignore_index=True, sort=False)
+    # Stream the workbook read-only and keep just the columns the workflows use
+    consolidated_df = load_master_sheets(dq_file_path, sheets_to_consolidate, workers=MASTER_PARSE_WORKERS)
+    # Normalized columns are derived here once and cached with the master
+    enrich_master(consolidated_df)
     
     logger.info(f"✅ Consolidated {len(consolidated_df)} total rules from {len(sheets_to_consolidate)} sheets")
     
     return consolidated_df
 
-def main_ui_workflow(dq_file_path, rules_df, workflow_type):
-    log_section_start(logger, f"Workflow: {workflow_type.upper()}")
-    
-    # Load and consolidate DQ rules master
-    logger.info("📂 Loading DQ Rules Master file...")
-    dq_rules_master = consolidate_dq_master_sheets(dq_file_path)
+
+def load_dq_master(dq_file_path, rule_ids=None):
+    if MASTER_BACKEND == "sqlite":
+        # The parse goes straight into the store and is never cached as a frame;
+        # the workflows read only the rules they were asked for from it
+        return open_master_store(dq_file_path, consolidate_dq_master_sheets)
     
-    # Standardize input DataFrame column names
-    rules_df.columns = [c.strip().lower() for c in rules_df.columns]
+    sheets = MASTER_SHEETS
     
-    generated_files = []
+    # With a full master already cached there is nothing to save by loading fewer sheets
+    if MASTER_LAZY_SHEETS and rule_ids is not None and not is_master_cached(dq_file_path):
+        sheets = _sheets_for_rule_ids(dq_file_path, rule_ids)
     
-    # Route to appropriate workflow
-    if workflow_type == "add_update":
-        generated_files = _process_add_update_workflow(dq_rules_master, rules_df, engine)
-    elif workflow_type == "configure":
-        generated_files = _process_configure_workflow(dq_rules_master, rules_df, engine)
+    if list(sheets) == list(MASTER_SHEETS):
+        # Parsed once per file content; later calls hit the in-memory or on-disk cache
+        dq_rules_master = load_cached_master(dq_file_path, consolidate_dq_master_sheets)
     else:
-        raise ValueError(f"Unknown workflow type: {workflow_type}")
+        logger.info(f"🗂️  Loading only sheet(s) with requested rules: {', '.join(sheets)}")
+        variant = "sheets-" + hashlib.sha1("|".join(sheets).encode("utf-8")).hexdigest()[:8]
+        dq_rules_master = load_cached_master(
+            dq_file_path,
+            lambda path: consolidate_dq_master_sheets(path, sheets),
+            variant=variant
+        )
+    
+    # Build the RuleID index up front so duplicates are reported at load time
+    if 'RuleID' in dq_rules_master.columns:
+        get_rule_index(dq_rules_master)
     
-    logger.info(f"📊 Total files generated: {len(generated_files)}")
+    return dq_rules_master
+
+
+def reload_dq_master(dq_file_path, previous_state=None):
+    # previous_state comes from rules.master_refresh.capture_master_state, taken before the upload
+    if previous_state is None:
+        return load_dq_master(dq_file_path)
+    
+    dq_rules_master = refresh_master(dq_file_path, previous_state, workers=MASTER_PARSE_WORKERS)
+    get_rule_index(dq_rules_master)
+    return dq_rules_master
+
+
+def warm_dq_master(dq_file_path, previous_state=None):
+    # Start consolidation and indexing without holding up the upload response
+    with _WARM_LOCK:
+        future = _WARM_EXECUTOR.submit(_warm_dq_master, dq_file_path, previous_state)
+        _WARM_JOBS[dq_file_path] = future
+    logger.info("🔥 DQ master build started in the background")
+    return future
+
+
+def _warm_dq_master(dq_file_path, previous_state):
+    try:
+        if MASTER_BACKEND == "sqlite":
+            store = load_dq_master(dq_file_path)
+            logger.info(f"✅ Background DQ master store ready: {store.db_path}")
+            return store
+        dq_rules_master = reload_dq_master(dq_file_path, previous_state)
+        logger.info(f"✅ Background DQ master build finished: {len(dq_rules_master)} rules")
+        return dq_rules_master
+    except Exception as e:
+        logger.error(f"❌ Background DQ master build failed: {e}")
+        raise
+
+
+def wait_for_master_warmup(dq_file_path):
+    future = _WARM_JOBS.get(dq_file_path)
+    if future is not None and not future.done():
+        logger.info("⏳ Waiting for the background DQ master build to finish...")
+        # A failed build is reported by the worker; the caller's own load surfaces the error
+        wait([future])
+
+
+def get_master_status(dq_file_path):
+    future = _WARM_JOBS.get(dq_file_path)
+    if future is not None:
+        if not future.done():
+            return "building"
+        if future.exception() is not None:
+            return "failed"
+        return "ready"
+    if MASTER_BACKEND == "sqlite":
+        return "ready" if is_master_stored(dq_file_path) else "not_loaded"
+    return "ready" if is_master_cached(dq_file_path) else "not_loaded"
+
+
+def _sheets_for_rule_ids(dq_file_path, rule_ids):
+    directory = load_cached_rule_directory(dq_file_path, build_rule_directory)
+    wanted = {directory.get(rule_id) for rule_id in rule_ids}
+    # Keep workbook order so first-occurrence semantics match the full master
+    sheets = [sheet for sheet in MASTER_SHEETS if sheet in wanted]
+    # Nothing matched: load a single sheet so lookups still run and report missing rules
+    return sheets or MASTER_SHEETS[:1]
+
+
+def main_ui_workflow(dq_file_path, rules_df, workflow_type):
+    log_section_start(logger, f"Workflow: {workflow_type.upper()}")
+    
+    with trace_run(workflow_type, rules=len(rules_df)) as trace:
+        # Standardize input DataFrame column names
+        rules_df.columns = [c.strip().lower() for c in rules_df.columns]
+        
+        # Load and consolidate DQ rules master (only the sheets these rules live in)
+        logger.info("📂 Loading DQ Rules Master file...")
+        with span("load_master"):
+            wait_for_master_warmup(dq_file_path)
+            dq_rules_master = load_dq_master(dq_file_path, rules_df["ruleid"].tolist())
+        
+        generated_files = []
+        
+        if workflow_type not in ("add_update", "configure"):
+            raise ValueError(f"Unknown workflow type: {workflow_type}")
+        
+        # One connection and one consistent snapshot for every lookup in this run
+        with workflow_session(engine) as session:
+            # Route to appropriate workflow
+            if workflow_type == "add_update":
+                generated_files = _process_add_update_workflow(dq_rules_master, rules_df, session)
+            else:
+                generated_files = _process_configure_workflow(dq_rules_master, rules_df, session)
+        
+        logger.info(f"📊 Total files generated: {len(generated_files)}")
+        trace.finish(generated_files, rules_df.iloc[0]["ticket"])
     
     return generated_files
 
@@ -122,19 +177,22 @@ def _process_add_update_workflow(dq_rules_master, rules_df, engine):
     logger.info(f"📌 Version: {version}")
     logger.info(f"🎫 Ticket: {ticket}")
     
-    # Prepare rules data using new modular function
-    dq_rules_df = prepare_add_update_rules(dq_rules_master, rules_df, engine)
-    
-    if dq_rules_df.empty:
-        logger.warning("⚠️  No rules to process")
-        return []
-    
-    # Generate output files
-    generated_files = []
-    
-    csv_file = write_csv(dq_rules_df, path, version)
-    log_file_operation(logger, "Generated CSV", csv_file)
-    generated_files.append(csv_file)
+    # Reserved rule_ids are given back if the run stops before its CSV is written
+    with id_reservations() as reservations:
+        # Prepare rules data using new modular function
+        dq_rules_df = prepare_add_update_rules(dq_rules_master, rules_df, engine)
+        
+        if dq_rules_df.empty:
+            logger.warning("⚠️  No rules to process")
+            return []
+        
+        # Generate output files
+        generated_files = []
+        
+        csv_file = write_csv(dq_rules_df, path, version)
+        reservations.keep()
+        log_file_operation(logger, "Generated CSV", csv_file)
+        generated_files.append(csv_file)
     
     xml_file = write_xml(path, version, ticket)
     log_file_operation(logger, "Generated XML", xml_file)
@@ -157,49 +215,115 @@ def _process_configure_workflow(dq_rules_master, rules_df, engine):
     logger.info(f"🎫 Ticket: {ticket}")
     logger.info(f"🏢 Tenants: {', '.join(unique_tenants)}")
     
+    # One UNION ALL round-trip per lookup answers every tenant of the ticket
+    prefetched = {}
+    if len(unique_tenants) > 1:
+        with span("prefetch_lookups", tenants=len(unique_tenants)):
+            prefetched = prefetch_configure_lookups(engine, rules_df, unique_tenants)
+    
+    # Tenants use separate schemas, data folders and output files, so they can run side by side
+    workers = min(CONFIGURE_TENANT_WORKERS, len(unique_tenants))
+    if workers <= 1:
+        generated_files = []
+        for tenant_name in unique_tenants:
+            tenant_configs = rules_df[rules_df["tenant"] == tenant_name]
+            with span("tenant", tenant=tenant_name):
+                generated_files.extend(
+                    _process_tenant(
+                        dq_rules_master, tenant_configs, tenant_name, ticket, engine, prefetched.get(tenant_name)
+                    )
+                )
+        return generated_files
+    
+    logger.info(f"🧵 Processing {len(unique_tenants)} tenants on {workers} threads")
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tenant") as pool:
+        futures = [
+            pool.submit(
+                _process_tenant_isolated,
+                dq_rules_master,
+                rules_df[rules_df["tenant"] == tenant_name],
+                tenant_name,
+                ticket,
+                engine.engine,
+                prefetched.get(tenant_name),
+                current_span()
+            )
+            for tenant_name in unique_tenants
+        ]
+        results = [future.result() for future in futures]
+    
+    # Replay each tenant's log block and collect files in input tenant order
     generated_files = []
+    first_error = None
+    for records, tenant_files, error in results:
+        flush_buffered_logs(records)
+        if error is not None:
+            first_error = first_error or error
+            continue
+        generated_files.extend(tenant_files)
     
-    # Process each tenant separately
-    for tenant_name in unique_tenants:
-        logger.info(f"\n{'─'*60}")
-        logger.info(f"Processing tenant: {tenant_name.upper()}")
-        logger.info(f"{'─'*60}")
-        
-        
-        # Get paths and version
-        path = TENANT_DATA_FOLDER_PATHS[tenant_name]
-        dev_path = TENANT_DEV_FILE_PATHS[tenant_name]
-        version = get_version_info_extn(path)
-        
-        logger.info(f"📌 Version: {version}")
-        
-        # Filter configurations for this tenant
-        tenant_configs = rules_df[rules_df["tenant"] == tenant_name]
-        logger.info(f"📊 Configurations: {len(tenant_configs)}")
-        
+    if first_error is not None:
+        raise first_error
+    
+    return generated_files
+
+
+def _process_tenant_isolated(dq_rules_master, tenant_configs, tenant_name, ticket, engine, prefetched=None, parent_span=None):
+    # Worker threads need their own connection; a session connection cannot be shared
+    with buffered_logs() as records, attach(parent_span):
+        try:
+            with span("tenant", tenant=tenant_name), workflow_session(engine) as session:
+                tenant_files = _process_tenant(dq_rules_master, tenant_configs, tenant_name, ticket, session, prefetched)
+        except Exception as e:
+            logger.error(f"❌ Tenant {tenant_name} failed: {e}")
+            return records, None, e
+    
+    return records, tenant_files, None
+
+
+def _process_tenant(dq_rules_master, tenant_configs, tenant_name, ticket, engine, prefetched=None):
+    logger.info(f"\n{'─'*60}")
+    logger.info(f"Processing tenant: {tenant_name.upper()}")
+    logger.info(f"{'─'*60}")
+    
+    # Get paths and version
+    path = TENANT_DATA_FOLDER_PATHS[tenant_name]
+    dev_path = TENANT_DEV_FILE_PATHS[tenant_name]
+    version = get_version_info_extn(path)
+    
+    logger.info(f"📌 Version: {version}")
+    logger.info(f"📊 Configurations: {len(tenant_configs)}")
+    
+    # Reserved rule_extn_ids are given back if the tenant stops before its CSV is written
+    with id_reservations() as reservations:
         # Prepare configuration data using new modular function
         dq_rules_extn_df = prepare_configure_rules(
             dq_rules_master, 
             tenant_configs, 
             tenant_name, 
-            engine
+            engine,
+            prefetched
         )
         
         if dq_rules_extn_df.empty:
             logger.warning(f"⚠️  No configurations to process for {tenant_name}")
-            continue
+            return []
         
         # Generate output files
+        generated_files = []
+        
         extn_csv_file = write_csv_extn(dq_rules_extn_df, path, version)
+        reservations.keep()
         log_file_operation(logger, "Generated CSV", extn_csv_file)
         generated_files.append(extn_csv_file)
-        
-        extn_xml_file = write_xml_extn(path, version, ticket)
-        log_file_operation(logger, "Generated XML", extn_xml_file)
-        generated_files.append(extn_xml_file)
-        
-        dev_file = update_dev_file(dev_path, version, ticket)
-        log_file_operation(logger, "Updated Dev File", dev_file)
-        generated_files.append(dev_file)
+    
+    extn_xml_file = write_xml_extn(path, version, ticket)
+    log_file_operation(logger, "Generated XML", extn_xml_file)
+    generated_files.append(extn_xml_file)
+    
+    dev_file = update_dev_file(dev_path, version, ticket)
+    log_file_operation(logger, "Updated Dev File", dev_file)
+    generated_files.append(dev_file)
     
     return generated_files
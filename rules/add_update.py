@@ -1,53 +1,72 @@
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from config import ADD_UPDATE_PREPARE_MODE, ADD_UPDATE_PREPARE_WORKERS
 from .helper import (
+    VALIDATION_RULE_COLUMNS,
+    select_master_rules,
     get_rule_from_master,
+    get_rule_index,
     get_metadata_id,
-    get_max_rule_id,
-    get_existing_rule_id,
-    check_duplicate_rule,
+    get_metadata_ids,
+    fetch_existing_rules,
     compare_rule_data,
-    extract_column_value,
-    standardize_entity_type,
-    standardize_sub_entity
+    compare_frames,
+    RULE_COMPARE_FIELDS
 )
-from .logger import setup_logger, log_separator
+from .enrichment import get_master_metadata_ids, log_missing_metadata
+from .id_allocator import allocate_rule_ids
+from .tracing import span, traced, current_span, attach
+from .logger import setup_logger, log_separator, buffered_logs, flush_buffered_logs
 
 logger = setup_logger("add_update")
 
 
+@traced("prepare_add_update_rules")
 def prepare_add_update_rules(dq_rules_master, rules_df, engine):
     logger.info("")
     log_separator(logger, "=", 60)
     logger.info("PREPARING ADD/UPDATE RULES")
     log_separator(logger, "=", 60)
     
-    # Get current max rule_id from database
-    max_rule_id = get_max_rule_id(engine)
-    logger.info(f"📊 Current max rule_id in database: {max_rule_id}")
+    dq_rules_master = select_master_rules(dq_rules_master, rules_df["ruleid"].tolist())
     
+    # Resolve existing rows for every requested rule in a single query
+    with span("existing_rules"):
+        existing_rules = _get_existing_rules(engine, rules_df["ruleid"].tolist())
+    logger.info(f"📊 Rules already in database: {len(existing_rules)} of {rules_df['ruleid'].nunique()}")
+    
+    # Reserve one contiguous block of rule_ids for the new rules; numbering below starts after max_rule_id
+    with span("allocate_rule_ids"):
+        new_count = _count_new_rules(dq_rules_master, rules_df, existing_rules)
+        max_rule_id = allocate_rule_ids(engine, new_count) - 1
+    logger.info(f"📊 New rules: {new_count}, numbered from rule_id {max_rule_id + 1}")
+    
+    with span("prepare_rules", mode=ADD_UPDATE_PREPARE_MODE):
+        if ADD_UPDATE_PREPARE_MODE == "rowwise":
+            rows = _prepare_rules_rowwise(dq_rules_master, rules_df, existing_rules, max_rule_id, engine)
+        else:
+            rows = _prepare_rules_vectorized(dq_rules_master, rules_df, existing_rules, max_rule_id, engine)
+    
+    logger.info("")
+    log_separator(logger, "=", 60)
+    logger.info(f"✅ Prepared {len(rows)} rule(s) for add/update")
+    log_separator(logger, "=", 60)
+    logger.info("")
+    
+    return rows
+
+
+def _prepare_rules_rowwise(dq_rules_master, rules_df, existing_rules, max_rule_id, engine):
     rows = []
     
-    for idx, rule in rules_df.iterrows():
-        rule_id = rule["ruleid"]
-        logger.info(f"\n🔄 Processing Rule #{idx + 1}: {rule_id}")
-        logger.info("-" * 60)
-        
-        # Step 1: Get the rule from consolidated master
-        master_row = get_rule_from_master(dq_rules_master, rule_id)
-        
-        if master_row is None:
-            logger.warning(f"⚠️  Rule ID '{rule_id}' not found in consolidated master. Skipping.")
+    for rule, rule_data in _resolve_rules(dq_rules_master, rules_df, engine):
+        if rule_data is None:
             continue
-        
-        # Log the source sheet for reference
-        source_sheet = master_row.get('SourceSheet', 'Unknown')
-        logger.info(f"✓ Found in sheet: '{source_sheet}'")
-        
-        # Step 3: Extract and transform rule data
-        rule_data = _extract_rule_data(master_row, rule, engine)
+        rule_id = rule["ruleid"]
         
         # Step 4: Determine rule_id (new or existing)
-        existing_rule_id = get_existing_rule_id(engine, rule_id)
+        existing_row = existing_rules.loc[rule_id] if rule_id in existing_rules.index else None
+        existing_rule_id = int(existing_row["rule_id"]) if existing_row is not None else None
         
         if existing_rule_id:
             rule_data["rule_id"] = existing_rule_id
@@ -58,53 +77,202 @@ def prepare_add_update_rules(dq_rules_master, rules_df, engine):
             logger.info(f"✓ Assigned new rule_id: {max_rule_id}")
         
         # Step 5: Check for duplicates
-        if _is_duplicate(engine, rule_id, rule_data):
+        with span("duplicate_check", rule_id=rule_id):
+            is_duplicate = _is_duplicate(existing_row, rule_data)
+        if is_duplicate:
             logger.warning(f"⚠️  Rule already exists with identical data. Skipping.")
             continue
         
         logger.info(f"✓ Rule data prepared for processing")
         rows.append(rule_data)
     
-    logger.info("")
-    log_separator(logger, "=", 60)
-    logger.info(f"✅ Prepared {len(rows)} rule(s) for add/update")
-    log_separator(logger, "=", 60)
-    logger.info("")
-    
     return pd.DataFrame(rows)
 
 
+def _resolve_rules(dq_rules_master, rules_df, engine):
+    # Yields (rule, rule_data) in input order; rule_data is None for rules missing from the master
+    workers = min(ADD_UPDATE_PREPARE_WORKERS, len(rules_df))
+    if workers <= 1:
+        for idx, rule in rules_df.iterrows():
+            yield rule, _resolve_rule(dq_rules_master, idx, rule, engine)
+        return
+    
+    logger.info(f"🧵 Resolving {len(rules_df)} rules on {workers} threads")
+    
+    # Session connections cannot be shared between threads; workers check out their own from the pool
+    parent_span = current_span()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rule") as pool:
+        futures = [
+            (rule, pool.submit(_resolve_rule_buffered, dq_rules_master, idx, rule, engine.engine, parent_span))
+            for idx, rule in rules_df.iterrows()
+        ]
+        
+        # Each rule's log block is replayed before its rule_id is assigned, so it stays in one piece
+        for rule, future in futures:
+            records, rule_data, error = future.result()
+            flush_buffered_logs(records)
+            if error is not None:
+                raise error
+            yield rule, rule_data
+
+
+def _resolve_rule_buffered(dq_rules_master, idx, rule, engine, parent_span=None):
+    with buffered_logs() as records, attach(parent_span):
+        try:
+            return records, _resolve_rule(dq_rules_master, idx, rule, engine), None
+        except Exception as e:
+            return records, None, e
+
+
+def _resolve_rule(dq_rules_master, idx, rule, engine):
+    rule_id = rule["ruleid"]
+    logger.info(f"\n🔄 Processing Rule #{idx + 1}: {rule_id}")
+    logger.info("-" * 60)
+    
+    with span("rule", rule_id=rule_id):
+        # Step 1: Get the rule from consolidated master
+        master_row = get_rule_from_master(dq_rules_master, rule_id)
+        
+        if master_row is None:
+            logger.warning(f"⚠️  Rule ID '{rule_id}' not found in consolidated master. Skipping.")
+            return None
+        
+        # Log the source sheet for reference
+        source_sheet = master_row.get('SourceSheet', 'Unknown')
+        logger.info(f"✓ Found in sheet: '{source_sheet}'")
+        
+        # Step 3: Extract and transform rule data
+        return _extract_rule_data(master_row, rule, engine)
+
+
+def _prepare_rules_vectorized(dq_rules_master, rules_df, existing_rules, max_rule_id, engine):
+    rules = rules_df.reset_index(drop=True)
+    
+    # Step 1: Join requested rules to the consolidated master through the RuleID index
+    with span("join_master"):
+        positions = rules["ruleid"].map(get_rule_index(dq_rules_master))
+        found = positions.notna()
+        for rule_id in rules.loc[~found, "ruleid"]:
+            logger.warning(f"⚠️  Rule ID '{rule_id}' not found in consolidated master. Skipping.")
+        
+        rules = rules[found]
+        if rules.empty:
+            return pd.DataFrame()
+        row_positions = positions[found].astype(int).to_numpy()
+        master_rows = dq_rules_master.iloc[row_positions].set_index(rules.index)
+    # Metadata ids are resolved once per master; a request only picks its rows
+    with span("metadata_ids"):
+        metadata_ids = get_master_metadata_ids(dq_rules_master, engine).iloc[row_positions].set_index(rules.index)
+        log_missing_metadata(master_rows, metadata_ids)
+    
+    # Step 2: Project the precomputed rule data for the requested rows
+    with span("extract_rule_frame"):
+        frame = _extract_rule_frame(master_rows, metadata_ids, rules, engine)
+    
+    # Step 3: Reuse existing rule_ids; number new ones in input order after the current max
+    with span("assign_rule_ids"):
+        has_existing = frame["business_rule_id"].isin(existing_rules.index)
+        # object dtype so reindexing cannot turn integer columns into floats before comparison
+        existing = existing_rules.astype(object).reindex(frame["business_rule_id"]).set_index(frame.index)
+        existing_ids = existing["rule_id"]
+        is_new = ~(has_existing & existing_ids.notna() & (existing_ids != 0))
+        new_ids = max_rule_id + is_new.cumsum()
+        frame["rule_id"] = [
+            int(new_id) if new else int(existing_id)
+            for new, new_id, existing_id in zip(is_new, new_ids, existing_ids)
+        ]
+    
+    # Step 4: Compare against existing rows in one pass; identical rules are dropped
+    with span("duplicate_check"):
+        comparison = compare_frames(existing[has_existing], frame[has_existing], RULE_COMPARE_FIELDS)
+    
+    keep = []
+    sheets = master_rows.get("SourceSheet", pd.Series("Unknown", index=master_rows.index))
+    for index, business_rule_id, rule_id, new in zip(frame.index, frame["business_rule_id"], frame["rule_id"], is_new):
+        # The column-wise work is timed by the stage spans above; this only covers each rule's decision
+        with span("rule", rule_id=business_rule_id):
+            state = "new" if new else "existing"
+            logger.info(f"🔄 Rule {business_rule_id}: sheet '{sheets[index]}', {state} rule_id {rule_id}")
+            
+            if index in comparison.index:
+                if comparison.at[index, "is_identical"]:
+                    logger.warning(f"⚠️  Rule {business_rule_id} already exists with identical data. Skipping.")
+                    continue
+                logger.info(f"✏️  Rule {business_rule_id} fields to update: {', '.join(comparison.at[index, 'changed_fields'])}")
+            keep.append(index)
+    
+    frame = frame.loc[keep]
+    if frame.empty:
+        return pd.DataFrame()
+    
+    # Rebuild from records so dtypes are inferred exactly as the row-wise list of dicts is
+    return pd.DataFrame(frame[VALIDATION_RULE_COLUMNS].to_dict("records"))
+
+
+def _extract_rule_frame(master_rows, metadata_ids, rules, engine):
+    index = master_rows.index
+    
+    def column_or(name, default=""):
+        if name in master_rows.columns:
+            return master_rows[name]
+        return pd.Series(default, index=index, dtype=object)
+    
+    def first_truthy(primary, fallback):
+        # Mirrors master_row.get(primary) or master_row.get(fallback, "")
+        fallback_values = column_or(fallback)
+        if primary not in master_rows.columns:
+            return fallback_values
+        primary_values = master_rows[primary].astype(object)
+        truthy = primary_values.map(lambda v: v is not pd.NA and bool(v))
+        return primary_values.where(truthy, fallback_values)
+    
+    # Rule Type (from UI) is the only value that comes from the request itself
+    rule_type = rules["ruletype"].astype(str).str.upper().str.strip() if "ruletype" in rules.columns \
+        else pd.Series("", index=index, dtype=object)
+    
+    return pd.DataFrame({
+        "rule_id": None,  # Will be set later
+        "business_rule_id": rules["ruleid"],
+        "rule_category_id": metadata_ids["rule_category_id"],
+        "rule_category_desc": master_rows["RuleCategoryCode"].astype(object),
+        "rule_name": first_truthy("RuleName", "Rule Name"),
+        "rule_desc": first_truthy("RuleDescription", "Rule Description"),
+        "rule_type_id": get_metadata_ids("Rule Type", rule_type, engine),
+        "entity_type_id": metadata_ids["entity_type_id"],
+        "range_type_id": "",
+        "min": "",
+        "max": "",
+        "regex_pattern": "",
+        "sql_query": "",
+        "batch_error_message": column_or("Interface( Batch, API) ingestion Error Message"),
+        "ui_error_message_summary": column_or("UI Error Message Summary"),
+        "ui_field_error_message": column_or("UI Error Message Under Field"),
+        "endorsement_date": column_or("Date Updated"),
+        "enabled": "Y",
+        "user_name": "SYSTEM",
+        "sub_entity_type_id": metadata_ids["sub_entity_type_id"],
+        "ingest_or_ui_id": metadata_ids["ingest_or_ui_id"],
+        "enforcement_level_id": metadata_ids["enforcement_level_id"],
+        "error_warning_type_id": metadata_ids["error_warning_type_id"],
+        "dq_wkflw_ticket_ind": "TRUE"
+    }, index=index)
+
+
 def _extract_rule_data(master_row, rule, engine):
-    # Rule Category - now standardized to RuleType
-    rule_category_raw = extract_column_value(master_row, "RuleType", "Rule Type", "Rule Category")
-    rule_category = rule_category_raw.upper().replace(" ", "_")
+    # Normalized values are precomputed on the master (see rules.enrichment)
+    rule_category = master_row["RuleCategoryCode"]
     rule_category_id = get_metadata_id("Rule Category", rule_category, engine)
     
     # Rule Type (from UI)
     rule_type = str(rule.get("ruletype", "")).upper().strip()
     rule_type_id = get_metadata_id("Rule Type", rule_type, engine)
     
-    # Entity Type
-    entity_type_raw = extract_column_value(master_row, "Entity")
-    entity_type = standardize_entity_type(entity_type_raw)
-    entity_type_id = get_metadata_id("Entity Type", entity_type, engine)
-    
-    # Sub Entity - now standardized to SubEntity
-    sub_entity_raw = extract_column_value(master_row, "SubEntity", "Sub Entity", "Sub-Entity")
-    sub_entity = standardize_sub_entity(sub_entity_raw)
-    sub_entity_id = get_metadata_id("Sub_Entity_Type", sub_entity, engine)
-    
-    # Ingest/UI - now standardized to IngestUIOnly
-    ingest_or_ui = extract_column_value(
-        master_row,
-        "IngestUIOnly",
-        "Ingest+UI/UI Only",
-        "Ingest+UI/Ui Only"
-    ).upper()
-    ingest_or_ui_id = get_metadata_id("Ingest_Or_UI", ingest_or_ui, engine)
+    entity_type_id = get_metadata_id("Entity Type", master_row["EntityTypeCode"], engine)
+    sub_entity_id = get_metadata_id("Sub_Entity_Type", master_row["SubEntityCode"], engine)
+    ingest_or_ui_id = get_metadata_id("Ingest_Or_UI", master_row["IngestUICode"], engine)
     
     # Enforcement Level
-    enforcement_level = extract_column_value(master_row, "Enforcement Level").upper()
+    enforcement_level = master_row["EnforcementLevelCode"]
     enforcement_level_id = None
     error_warning_type_id = None
     
@@ -144,12 +312,33 @@ def _extract_rule_data(master_row, rule, engine):
     }
 
 
-def _is_duplicate(engine, business_rule_id, new_rule_data):
-    existing = check_duplicate_rule(engine, business_rule_id)
+def _count_new_rules(dq_rules_master, rules_df, existing_rules):
+    # Requested rules found in the master without a usable existing rule_id
+    if 'RuleID' not in dq_rules_master.columns:
+        return 0
+    
+    rule_index = get_rule_index(dq_rules_master)
+    count = 0
+    for rule_id in rules_df["ruleid"]:
+        if rule_id not in rule_index:
+            continue
+        existing_id = existing_rules.at[rule_id, "rule_id"] if rule_id in existing_rules.index else None
+        if existing_id is None or pd.isna(existing_id) or existing_id == 0:
+            count += 1
+    return count
+
+
+def _get_existing_rules(engine, business_rule_ids):
+    existing = fetch_existing_rules(engine, business_rule_ids)
     
-    if existing.empty:
+    # First row per business_rule_id, as the old per-rule lookups used
+    existing = existing.drop_duplicates(subset="business_rule_id", keep="first")
+    existing.index = pd.Index(existing["business_rule_id"], name=None)
+    return existing
+
+
+def _is_duplicate(existing_row, new_rule_data):
+    if existing_row is None:
         return False
     
-    existing_row = existing.iloc[0]
     return compare_rule_data(existing_row, new_rule_data)
-
@@ -0,0 +1,136 @@
+import asyncio
+import atexit
+import threading
+from collections import namedtuple
+import pandas as pd
+from sqlalchemy.engine import Connection
+from config import DB_ASYNC_LOOKUPS, DB_ASYNC_POOL_SIZE, ASYNC_POSTGRES_DSN
+from .session import use_connection, compile_query, positional_sql
+from .logger import setup_logger
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+logger = setup_logger("async_db")
+
+# One read-only query: SQL with :name parameters, its values, and which of them are IN-lists
+Lookup = namedtuple("Lookup", ["sql", "params", "expanding"], defaults=(None, ()))
+
+
+def run_lookups(bind, lookups):
+    """Run independent lookups and return ``{name: DataFrame}`` for ``{name: Lookup}``.
+
+    With ``DB_ASYNC_LOOKUPS`` on a Postgres backend they are issued concurrently
+    over an asyncpg pool. When ``bind`` is a workflow session, every query
+    imports the session's snapshot, so results match what the session itself
+    would read. Otherwise they run one after another on ``bind``.
+    """
+    if not lookups:
+        return {}
+
+    if not async_lookups_enabled(bind):
+        with use_connection(bind) as conn:
+            return {
+                name: pd.read_sql(compile_query(lookup.sql, tuple(lookup.expanding)), conn, params=lookup.params or {})
+                for name, lookup in lookups.items()
+            }
+
+    snapshot = _export_snapshot(bind)
+    return _RUNNER.run(_gather_lookups(lookups, snapshot))
+
+
+def async_lookups_enabled(bind):
+    if not DB_ASYNC_LOOKUPS or bind.dialect.name != "postgresql":
+        return False
+    if asyncpg is None:
+        logger.warning("⚠️ DB_ASYNC_LOOKUPS is on but asyncpg is not installed; running lookups sequentially")
+        return False
+    return True
+
+
+def close_async_pool():
+    # Registered with atexit below; a no-op when no lookup ever started the loop
+    _RUNNER.close()
+
+
+def _export_snapshot(bind):
+    # A session's REPEATABLE READ snapshot can be shared with other connections while it stays open
+    if isinstance(bind, Connection) and bind.in_transaction():
+        return bind.exec_driver_sql("SELECT pg_export_snapshot()").scalar()
+    return None
+
+
+async def _gather_lookups(lookups, snapshot):
+    pool = await _RUNNER.get_pool()
+    frames = await asyncio.gather(*(_fetch_frame(pool, lookup, snapshot) for lookup in lookups.values()))
+    return dict(zip(lookups, frames))
+
+
+async def _fetch_frame(pool, lookup, snapshot):
+    sql, names = positional_sql(lookup.sql, lookup.expanding)
+    params = lookup.params or {}
+
+    async with pool.acquire() as conn:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            if snapshot:
+                await conn.execute(f"SET TRANSACTION SNAPSHOT '{snapshot}'")
+            # asyncpg keeps prepared statements per connection, so repeated lookups are planned once
+            statement = await conn.prepare(sql)
+            rows = await statement.fetch(*(list(params[name]) if name in lookup.expanding else params[name] for name in names))
+            columns = [attribute.name for attribute in statement.get_attributes()]
+
+    # Same construction pd.read_sql uses, so both paths return identically typed frames
+    return pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns, coerce_float=True)
+
+
+class _AsyncRunner:
+    """Event loop on a daemon thread that owns the asyncpg pool.
+
+    The pool is bound to the loop it was created on, so every call from the
+    synchronous workflow is scheduled onto this one loop.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._pool = None
+        self._pool_lock = None
+        self._lock = threading.Lock()
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop()).result()
+
+    async def get_pool(self):
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(ASYNC_POSTGRES_DSN, min_size=1, max_size=DB_ASYNC_POOL_SIZE)
+                logger.info(f"🔌 Opened async lookup pool (max {DB_ASYNC_POOL_SIZE} connections)")
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            if self._pool is not None:
+                asyncio.run_coroutine_threadsafe(self._pool.close(), self._loop).result()
+                self._pool = None
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-lookups", daemon=True).start()
+                self._pool_lock = asyncio.run_coroutine_threadsafe(self._make_lock(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    @staticmethod
+    async def _make_lock():
+        return asyncio.Lock()
+
+
+_RUNNER = _AsyncRunner()
+atexit.register(close_async_pool)
@@ -0,0 +1,122 @@
+import argparse
+import os
+import sqlite3
+from contextlib import closing
+import pandas as pd
+from sqlalchemy import create_engine, event, inspect, types
+from .logger import setup_logger
+
+logger = setup_logger("backend")
+
+# Tables the add/update and configure workflows read from each {tenant}_configdb schema
+CONFIGDB_TABLES = [
+    "validation_rule_metadata",
+    "validation_rules",
+    "des_validation_rules_extn",
+    "des_zone_table_list",
+    "pdm_entity_master",
+    "cdi_mapping_table",
+    "cdi_definition"
+]
+
+
+def configdb_schemas(tenants):
+    return [f"{tenant}_configdb" for tenant in tenants if tenant != "common"]
+
+
+def get_snapshot_path(snapshot_dir, schema):
+    return os.path.join(snapshot_dir, f"{schema}.sqlite")
+
+
+def create_sqlite_engine(snapshot_dir, schemas):
+    """Engine over a local SQLite snapshot of the configdb schemas.
+
+    Each schema is its own file, ATTACHed under the schema name on every new
+    connection, so the workflows' ``{tenant}_configdb.table`` SQL and SQLAlchemy
+    ``:name`` parameters run unchanged against Postgres or the snapshot.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    engine = create_engine(
+        f"sqlite:///{os.path.join(snapshot_dir, 'main.sqlite')}",
+        # Pooled connections are shared by the configure worker threads
+        connect_args={"check_same_thread": False}
+    )
+
+    @event.listens_for(engine, "connect")
+    def _attach_schemas(dbapi_connection, connection_record):
+        for schema in schemas:
+            dbapi_connection.execute(f"ATTACH DATABASE ? AS \"{schema}\"", (get_snapshot_path(snapshot_dir, schema),))
+
+    return engine
+
+
+def export_snapshot(source_engine, snapshot_dir, schemas, tables=CONFIGDB_TABLES):
+    # Copy the configdb tables from a live database into one SQLite file per schema
+    os.makedirs(snapshot_dir, exist_ok=True)
+    inspector = inspect(source_engine)
+
+    for schema in schemas:
+        snapshot_path = get_snapshot_path(snapshot_dir, schema)
+        tmp_path = f"{snapshot_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        existing_tables = set(inspector.get_table_names(schema=schema))
+        with closing(sqlite3.connect(tmp_path)) as snapshot, source_engine.connect() as conn:
+            for table in tables:
+                if table not in existing_tables:
+                    logger.warning(f"⚠️ {schema}.{table} not found in source database, skipping")
+                    continue
+                column_types = _snapshot_column_types(inspector.get_columns(table, schema=schema))
+                data = pd.read_sql(f"SELECT * FROM {schema}.{table}", conn)
+                # read_sql turns an integer column with NULLs into float64; keep it integral
+                for column, column_type in column_types.items():
+                    if column_type == "INTEGER" and column in data.columns and data[column].dtype.kind == "f":
+                        data[column] = data[column].astype("Int64")
+                data.to_sql(table, snapshot, index=False, dtype=column_types)
+                logger.info(f"  ✓ {schema}.{table}: {len(data)} rows")
+            snapshot.commit()
+
+        os.replace(tmp_path, snapshot_path)
+        logger.info(f"💾 Snapshot written: {snapshot_path}")
+
+
+def _snapshot_column_types(columns):
+    # SQLite column types matching the source table's reflected types
+    column_types = {}
+    for column in columns:
+        column_type = column["type"]
+        if isinstance(column_type, types.Integer):
+            column_types[column["name"]] = "INTEGER"
+        elif isinstance(column_type, types.Float):
+            column_types[column["name"]] = "REAL"
+        elif isinstance(column_type, types.Numeric):
+            column_types[column["name"]] = "NUMERIC"
+        elif isinstance(column_type, types.Boolean):
+            column_types[column["name"]] = "BOOLEAN"
+        elif isinstance(column_type, (types.Date, types.DateTime)):
+            column_types[column["name"]] = "TIMESTAMP"
+        else:
+            column_types[column["name"]] = "TEXT"
+    return column_types
+
+
+def main(argv=None):
+    # python -m rules.backend export [--out DIR] [--tenant NAME ...]
+    from config import POSTGRES_URL, SQLITE_SNAPSHOT_DIR, TENANT_DEV_FILE_PATHS
+
+    parser = argparse.ArgumentParser(description="Build the offline SQLite configdb snapshot from Postgres")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--out", default=SQLITE_SNAPSHOT_DIR, help="snapshot directory")
+    parser.add_argument("--tenant", action="append", help="tenant to export (default: all configured tenants)")
+    args = parser.parse_args(argv)
+
+    source_engine = create_engine(POSTGRES_URL)
+    try:
+        export_snapshot(source_engine, args.out, configdb_schemas(args.tenant or list(TENANT_DEV_FILE_PATHS)))
+    finally:
+        source_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
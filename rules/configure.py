@@ -1,35 +1,56 @@
 import pandas as pd
-from sqlalchemy import text
 from .helper import (
+    select_master_rules,
     get_rule_from_master,
-    get_max_rule_extn_id,
-    get_existing_rule_extn_id,
+    get_rule_index,
     get_hrpdm_table_id,
     get_entity_info,
     get_source_table_id,
-    check_duplicate_config,
-    compare_config_data,
-    extract_column_value
+    compare_frames,
+    restore_integer_columns,
+    RULE_EXTN_COLUMNS,
+    RULE_EXTN_INTEGER_COLUMNS,
+    CONFIG_COMPARE_FIELDS
 )
+from .reference import get_tenant_reference, load_tenant_references
+from .fanout import rule_ids_lookup, collect_rule_ids, fetch_rule_extns_by_tenant
+from .id_allocator import allocate_rule_extn_ids
+from .tracing import span, traced
 from .logger import setup_logger, log_separator
 
 logger = setup_logger("configure")
 
 
-def prepare_configure_rules(dq_rules_master, config_df, tenant, engine):
+@traced("prepare_configure_rules")
+def prepare_configure_rules(dq_rules_master, config_df, tenant, engine, prefetched=None):
     logger.info("")
     log_separator(logger, "=", 60)
     logger.info(f"PREPARING CONFIGURE RULES FOR TENANT: {tenant.upper()}")
     log_separator(logger, "=", 60)
     
-    # Get initial max IDs from database
-    max_hrp_id = get_max_rule_extn_id(engine, tenant, source_owner="HRP")
-    max_overall_id = get_max_rule_extn_id(engine, tenant)
+    dq_rules_master = select_master_rules(dq_rules_master, config_df["ruleid"].tolist())
     
-    logger.info(f"📊 Max HRP rule_extn_id: {max_hrp_id}")
-    logger.info(f"📊 Max overall rule_extn_id: {max_overall_id}")
+    # Resolve rule IDs and existing extension rows for the whole batch up front,
+    # unless a multi-tenant ticket already fetched them for every tenant at once
+    if prefetched is not None:
+        db_rule_ids, existing_extns = prefetched
+        _log_prefetched(tenant, db_rule_ids, existing_extns)
+    else:
+        with span("prefetch_lookups", tenants=1):
+            db_rule_ids, existing_extns = _prefetch_tenant_lookups(engine, config_df, tenant)
+    
+    # Reserve HRP and non-HRP rule_extn_id blocks for the new configurations
+    with span("allocate_rule_extn_ids"):
+        hrp_count, other_count = _count_new_configs(dq_rules_master, config_df, db_rule_ids, existing_extns)
+        first_hrp_id, first_other_id = allocate_rule_extn_ids(engine, tenant, hrp_count, other_count)
+    max_hrp_id = first_hrp_id - 1
+    max_overall_id = first_other_id - 1
+    
+    logger.info(f"📊 New HRP configurations: {hrp_count}, numbered from rule_extn_id {first_hrp_id}")
+    logger.info(f"📊 New other configurations: {other_count}, numbered from rule_extn_id {first_other_id}")
     
     rows = []
+    existing_rows = []
     
     for idx, config in config_df.iterrows():
         rule_id = config["ruleid"]
@@ -41,7 +62,7 @@ def prepare_configure_rules(dq_rules_master, config_df, tenant, engine):
         logger.info("-" * 60)
         
         # Step 1: Get rule_id from validation_rules table
-        db_rule_id = _get_rule_id_from_db(engine, rule_id, tenant)
+        db_rule_id = db_rule_ids.get(rule_id)
         if db_rule_id is None:
             logger.warning(f"⚠️  Rule '{rule_id}' not found in {tenant} validation_rules. Skipping.")
             continue
@@ -58,7 +79,8 @@ def prepare_configure_rules(dq_rules_master, config_df, tenant, engine):
         logger.info(f"✓ Found in sheet: '{source_sheet}'")
         
         # Step 4: Determine rule_extn_id (new or existing)
-        existing_extn_id = get_existing_rule_extn_id(engine, db_rule_id, source_owner, tenant)
+        existing_row = existing_extns.get((db_rule_id, source_owner))
+        existing_extn_id = int(existing_row["rule_extn_id"]) if existing_row is not None else None
         
         if existing_extn_id:
             rule_extn_id = existing_extn_id
@@ -68,7 +90,6 @@ def prepare_configure_rules(dq_rules_master, config_df, tenant, engine):
             if source_owner == 'HRP':
                 max_hrp_id += 1
                 rule_extn_id = max_hrp_id
-                max_overall_id = max(max_overall_id, rule_extn_id)
                 logger.info(f"✓ Assigned new HRP rule_extn_id: {rule_extn_id}")
             else:
                 max_overall_id += 1
@@ -76,60 +97,129 @@ def prepare_configure_rules(dq_rules_master, config_df, tenant, engine):
                 logger.info(f"✓ Assigned new rule_extn_id: {rule_extn_id}")
         
         # Step 5: Extract configuration data
-        config_data = _extract_config_data(
-            master_row, 
-            config, 
-            db_rule_id, 
-            rule_extn_id,
-            zone,
-            source_owner,
-            tenant, 
-            engine
-        )
+        with span("rule", rule_id=rule_id, source_owner=source_owner):
+            config_data = _extract_config_data(
+                master_row, 
+                config, 
+                db_rule_id, 
+                rule_extn_id,
+                zone,
+                source_owner,
+                tenant, 
+                engine
+            )
         
         if config_data is None:
             logger.warning(f"⚠️  Could not extract configuration data. Skipping.")
             continue
         
-        # Step 6: Check for duplicates
-        if _is_duplicate(engine, db_rule_id, source_owner, tenant, config_data):
-            logger.warning(f"⚠️  Configuration already exists with identical data. Skipping.")
-            continue
-        
         logger.info(f"✓ Configuration data prepared for processing")
         rows.append(config_data)
+        existing_rows.append(existing_row)
+    
+    # Step 6: Check all candidates against their existing rows in one pass
+    with span("duplicate_check"):
+        rows = _drop_duplicates(rows, existing_rows)
     
     logger.info("")
     log_separator(logger, "=", 60)
     logger.info(f"✅ Prepared {len(rows)} configuration(s) for tenant {tenant}")
+    stats = get_tenant_reference(tenant).stats()
+    logger.info(f"📈 Reference cache for {tenant}: {stats['hits']} hits, {stats['misses']} misses, {stats['loads']} loads")
     log_separator(logger, "=", 60)
     logger.info("")
     
     return pd.DataFrame(rows)
 
 
-def _get_rule_id_from_db(engine, business_rule_id, tenant):
-    query = text(f"""
-        SELECT rule_id 
-        FROM {tenant}_configdb.validation_rules 
-        WHERE business_rule_id = :rule_id
-    """)
+def _count_new_configs(dq_rules_master, config_df, db_rule_ids, existing_extns):
+    # (HRP, non-HRP) configurations that will need a new rule_extn_id
+    rule_index = get_rule_index(dq_rules_master)
+    hrp_count = other_count = 0
+    
+    source_owners = config_df["sourceownername"] if "sourceownername" in config_df.columns \
+        else pd.Series("", index=config_df.index)
     
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn, params={"rule_id": business_rule_id})
+    for rule_id, source_owner in zip(config_df["ruleid"], source_owners):
+        source_owner = source_owner.upper()
+        db_rule_id = db_rule_ids.get(rule_id)
+        if db_rule_id is None or rule_id not in rule_index:
+            continue
+        existing_row = existing_extns.get((db_rule_id, source_owner))
+        if existing_row is not None and int(existing_row["rule_extn_id"]):
+            continue
+        if source_owner == 'HRP':
+            hrp_count += 1
+        else:
+            other_count += 1
     
-    if not result.empty:
-        return int(result.iloc[0, 0])
-    return None
+    return hrp_count, other_count
+
+
+def prefetch_configure_lookups(engine, configs_df, tenants):
+    # Lookups for every tenant of a ticket in one UNION ALL round-trip per table:
+    # tenant -> (db_rule_ids, existing_extns), as _prefetch_tenant_lookups returns
+    tenants = list(tenants)
+    business_rule_ids = configs_df["ruleid"].tolist()
+    
+    # Rule IDs and reference tables do not depend on each other, so they go out as one batch
+    lookups = {"rule_ids": rule_ids_lookup(tenants, business_rule_ids)} if business_rule_ids else {}
+    results = load_tenant_references(engine, tenants, lookups)
+    rule_ids_by_tenant = (
+        collect_rule_ids(results["rule_ids"], tenants) if lookups else {tenant: {} for tenant in tenants}
+    )
+    
+    # Each tenant only sees the rule IDs it was asked for
+    for tenant in tenants:
+        requested = set(configs_df.loc[configs_df["tenant"] == tenant, "ruleid"])
+        rule_ids_by_tenant[tenant] = {
+            business_rule_id: rule_id
+            for business_rule_id, rule_id in rule_ids_by_tenant[tenant].items()
+            if business_rule_id in requested
+        }
+    
+    extns_by_tenant = fetch_rule_extns_by_tenant(
+        engine,
+        {tenant: rule_ids.values() for tenant, rule_ids in rule_ids_by_tenant.items()},
+        RULE_EXTN_COLUMNS
+    )
+    
+    return {
+        tenant: (
+            rule_ids_by_tenant[tenant],
+            _key_existing_extns(restore_integer_columns(extns_by_tenant[tenant], RULE_EXTN_INTEGER_COLUMNS))
+        )
+        for tenant in tenants
+    }
+
+
+def _prefetch_tenant_lookups(engine, config_df, tenant):
+    db_rule_ids, existing_extns = prefetch_configure_lookups(engine, config_df, [tenant])[tenant]
+    _log_prefetched(tenant, db_rule_ids, existing_extns)
+    return db_rule_ids, existing_extns
+
+
+def _key_existing_extns(existing):
+    existing_extns = {}
+    for _, row in existing.iterrows():
+        key = (int(row["rule_id"]), str(row["source_owner_name"]).upper())
+        # First row per key, as the old per-row lookups used
+        existing_extns.setdefault(key, row)
+    return existing_extns
+
+
+def _log_prefetched(tenant, db_rule_ids, existing_extns):
+    logger.info(f"📊 Rules found in {tenant} validation_rules: {len(db_rule_ids)}")
+    logger.info(f"📊 Existing rule_extn rows for batch: {len(existing_extns)}")
 
 
 def _extract_config_data(master_row, config, rule_id, rule_extn_id, zone, source_owner, tenant, engine):
-    # Get table information - use standardized column names
-    target_table = extract_column_value(master_row, "TableName", "Table Name").upper()
+    # Get table information - uppercased once on the master (see rules.enrichment)
+    target_table = master_row["TableNameUpper"]
     hrpdm_table_id = get_hrpdm_table_id(engine, target_table, zone, tenant)
     
     # Get entity information
-    entity_type = extract_column_value(master_row, "Entity").upper()
+    entity_type = master_row["EntityUpper"]
     pdm_entity_id, entity_key = get_entity_info(engine, entity_type, tenant)
     
     # Get source table ID (only for non-HRP)
@@ -138,12 +228,8 @@ def _extract_config_data(master_row, config, rule_id, rule_extn_id, zone, source
     else:
         source_table_id = get_source_table_id(engine, source_owner, tenant)
     
-    # Get column names - use standardized column names
-    hrpdm_column_names = extract_column_value(
-        master_row,
-        "ColumnName",
-        "Column Name"
-    ).upper()
+    # Get column names
+    hrpdm_column_names = master_row["ColumnNameUpper"]
     
     if zone == "RAW":
         hrpdm_table_id = None
@@ -170,12 +256,33 @@ def _extract_config_data(master_row, config, rule_id, rule_extn_id, zone, source
     }
 
 
-def _is_duplicate(engine, rule_id, source_owner, tenant, new_config_data):
-    existing = check_duplicate_config(engine, rule_id, source_owner, tenant)
+def _drop_duplicates(rows, existing_rows):
+    has_existing = [existing_row is not None for existing_row in existing_rows]
+    if not any(has_existing):
+        return rows
     
-    if existing.empty:
-        return False
+    # object dtype keeps ints as ints, so values stringify exactly as the row-by-row check did
+    candidates = pd.DataFrame([row for row, flag in zip(rows, has_existing) if flag], dtype=object)
+    existing = pd.DataFrame(
+        [existing_row.tolist() for existing_row in existing_rows if existing_row is not None],
+        columns=RULE_EXTN_COLUMNS,
+        dtype=object
+    )
+    comparison = compare_frames(existing, candidates, CONFIG_COMPARE_FIELDS)
     
-    existing_row = existing.iloc[0]
-    return compare_config_data(existing_row, new_config_data)
-
+    kept = []
+    compared = iter(comparison.itertuples(index=False))
+    for row, flag in zip(rows, has_existing):
+        if not flag:
+            kept.append(row)
+            continue
+        
+        is_identical, changed_fields = next(compared)
+        label = f"{row['rule_id']}/{row['source_owner_name']}"
+        if is_identical:
+            logger.warning(f"⚠️  Configuration {label} already exists with identical data. Skipping.")
+            continue
+        logger.info(f"✏️  Configuration {label} fields to update: {', '.join(changed_fields)}")
+        kept.append(row)
+    
+    return kept
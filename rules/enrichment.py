@@ -0,0 +1,119 @@
+import weakref
+import pandas as pd
+from .helper import (
+    extract_column_values,
+    standardize_entity_types,
+    standardize_sub_entities,
+    is_blank_metadata,
+    map_metadata_values,
+    metadata_set_name
+)
+from .metadata import get_metadata_map
+from .logger import setup_logger
+
+logger = setup_logger("enrichment")
+
+# Normalized values the add/update and configure workflows derive from each master row.
+# Computed once when the master is consolidated and cached alongside it.
+ENRICHED_COLUMNS = [
+    'RuleCategoryCode',
+    'EntityTypeCode',
+    'SubEntityCode',
+    'IngestUICode',
+    'EnforcementLevelCode',
+    'EntityUpper',
+    'TableNameUpper',
+    'ColumnNameUpper'
+]
+
+# id column -> (validation_rule_metadata set, enriched column it is looked up by)
+METADATA_ID_COLUMNS = {
+    'rule_category_id': ("Rule Category", 'RuleCategoryCode'),
+    'entity_type_id': ("Entity Type", 'EntityTypeCode'),
+    'sub_entity_type_id': ("Sub_Entity_Type", 'SubEntityCode'),
+    'ingest_or_ui_id': ("Ingest_Or_UI", 'IngestUICode'),
+    'enforcement_level_id': ("Enforcement_Level", 'EnforcementLevelCode')
+}
+
+# id(master) -> (weakref to master, metadata map the ids were resolved against, ids frame)
+_METADATA_ID_FRAMES = {}
+
+
+def enrich_master(dq_rules_master):
+    master = dq_rules_master
+
+    enriched = {
+        'RuleCategoryCode': extract_column_values(master, "RuleType", "Rule Type", "Rule Category")
+            .str.upper().str.replace(" ", "_", regex=False),
+        'EntityTypeCode': standardize_entity_types(extract_column_values(master, "Entity")),
+        'SubEntityCode': standardize_sub_entities(
+            extract_column_values(master, "SubEntity", "Sub Entity", "Sub-Entity")
+        ),
+        'IngestUICode': extract_column_values(master, "IngestUIOnly", "Ingest+UI/UI Only", "Ingest+UI/Ui Only")
+            .str.upper(),
+        'EnforcementLevelCode': extract_column_values(master, "Enforcement Level").str.upper(),
+        'EntityUpper': extract_column_values(master, "Entity").str.upper(),
+        'TableNameUpper': extract_column_values(master, "TableName", "Table Name").str.upper(),
+        'ColumnNameUpper': extract_column_values(master, "ColumnName", "Column Name").str.upper()
+    }
+
+    for column, values in enriched.items():
+        # Column names repeat across thousands of rules, so everything but ColumnName is categorical
+        master[column] = values if column == 'ColumnNameUpper' else values.astype("category")
+
+    return master
+
+
+def get_master_metadata_ids(dq_rules_master, engine):
+    # Metadata ids for every master row; re-resolved when the metadata cache reloads
+    try:
+        metadata_map = get_metadata_map(engine)
+    except Exception as e:
+        logger.warning(f"⚠️ Error getting metadata for master rows: {e}")
+        return build_metadata_id_frame(dq_rules_master, {})
+
+    key = id(dq_rules_master)
+    entry = _METADATA_ID_FRAMES.get(key)
+    if entry is not None and entry[0]() is dq_rules_master and entry[1] is metadata_map:
+        return entry[2]
+
+    ids = build_metadata_id_frame(dq_rules_master, metadata_map)
+    _METADATA_ID_FRAMES[key] = (
+        weakref.ref(dq_rules_master, lambda _, key=key: _METADATA_ID_FRAMES.pop(key, None)),
+        metadata_map,
+        ids
+    )
+    logger.info(f"🏷️  Resolved metadata ids for {len(ids)} master rows")
+    return ids
+
+
+def build_metadata_id_frame(dq_rules_master, metadata_map):
+    ids = {}
+    for id_column, (metadata_type, column) in METADATA_ID_COLUMNS.items():
+        values = dq_rules_master[column].astype(object)
+        # Resolve each distinct value once, then broadcast to the rows
+        unique_values = pd.Series(values.unique(), dtype=object)
+        resolved, _ = map_metadata_values(metadata_type, unique_values, metadata_map)
+        lookup = dict(zip(unique_values, resolved))
+        ids[id_column] = pd.Series([lookup[value] for value in values], index=dq_rules_master.index, dtype=object)
+
+    # No enforcement level, no error/warning type; level 28 is an error, anything else a warning
+    level = dq_rules_master['EnforcementLevelCode'].astype(object)
+    has_enforcement = (level != "") & (level != "NA")
+    ids['error_warning_type_id'] = pd.Series(
+        [(31 if level_id == 28 else 32) if enforced else None
+         for enforced, level_id in zip(has_enforcement, ids['enforcement_level_id'])],
+        index=dq_rules_master.index,
+        dtype=object
+    )
+
+    return pd.DataFrame(ids, index=dq_rules_master.index)
+
+
+def log_missing_metadata(master_rows, metadata_ids):
+    # Same warnings get_metadata_ids gives, limited to the rows a request touches
+    for id_column, (metadata_type, column) in METADATA_ID_COLUMNS.items():
+        values = master_rows[column].astype(object)
+        missing = ~is_blank_metadata(values) & metadata_ids[id_column].isna()
+        for value in values[missing].unique():
+            logger.warning(f"⚠️ Metadata not found: {metadata_set_name(metadata_type)} = {value}")
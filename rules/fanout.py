@@ -0,0 +1,90 @@
+import pandas as pd
+from .session import configdb_schema
+from .async_db import Lookup, run_lookups
+from .logger import setup_logger
+
+logger = setup_logger("fanout")
+
+TENANT_COLUMN = "tenant"
+
+RULE_IDS_SQL = "SELECT business_rule_id, rule_id FROM {schema}.validation_rules WHERE business_rule_id IN :rule_ids"
+
+
+def union_lookup(tenants, select_template, params=None, expanding=()):
+    """One lookup answering the same query for several {tenant}_configdb schemas.
+
+    ``select_template`` is a single SELECT with ``{schema}`` for the schema name and
+    ``{i}`` for the branch number, so per-tenant parameters can be named e.g.
+    ``:rule_ids_{i}``. Every branch is tagged with a ``tenant`` column. Names in
+    ``expanding`` are list parameters (``IN :name``); per-branch ones use ``{i}``.
+    """
+    branches = []
+    bind_names = set()
+    for i, tenant in enumerate(tenants):
+        # The whitelist also keeps the tenant literal below safe to inline
+        schema = configdb_schema(tenant)
+        branches.append(f"SELECT '{tenant}' AS {TENANT_COLUMN}, branch.* FROM ({select_template.format(schema=schema, i=i)}) branch")
+        bind_names.update(name.format(i=i) for name in expanding)
+
+    return Lookup("\nUNION ALL\n".join(branches), params or {}, tuple(sorted(bind_names)))
+
+
+def read_union(engine, tenants, select_template, params=None, expanding=()):
+    result = run_lookups(engine, {"union": union_lookup(tenants, select_template, params, expanding)})["union"]
+    logger.info(f"🔀 One round-trip for {len(tenants)} tenants: {len(result)} rows")
+    return split_by_tenant(result, tenants)
+
+
+def split_by_tenant(result, tenants):
+    # tenant -> rows without the tag, typed as that tenant's own query would have returned them
+    frames = {}
+    for tenant in tenants:
+        frame = result[result[TENANT_COLUMN] == tenant].drop(columns=TENANT_COLUMN).reset_index(drop=True)
+        for column in frame.columns:
+            values = frame[column]
+            # A NULL in another tenant's rows turns an integer column into floats for everyone
+            if values.dtype.kind == "f" and values.notna().all() and (values % 1 == 0).all():
+                frame[column] = values.astype("int64")
+        frames[tenant] = frame
+    return frames
+
+
+def rule_ids_lookup(tenants, business_rule_ids):
+    return union_lookup(
+        tenants,
+        RULE_IDS_SQL,
+        params={"rule_ids": list(dict.fromkeys(business_rule_ids))},
+        expanding=("rule_ids",)
+    )
+
+
+def collect_rule_ids(result, tenants):
+    # tenant -> {business_rule_id: rule_id}, first row per id as the per-tenant lookup used
+    rule_ids = {}
+    for tenant, frame in split_by_tenant(result, tenants).items():
+        tenant_ids = {}
+        for business_rule_id, rule_id in frame.itertuples(index=False):
+            tenant_ids.setdefault(business_rule_id, int(rule_id))
+        rule_ids[tenant] = tenant_ids
+    return rule_ids
+
+
+def fetch_rule_extns_by_tenant(engine, rule_ids_by_tenant, columns):
+    # tenant -> extension rows for that tenant's rule_ids
+    tenants = [tenant for tenant, rule_ids in rule_ids_by_tenant.items() if rule_ids]
+    empty = {tenant: pd.DataFrame(columns=columns) for tenant in rule_ids_by_tenant}
+    if not tenants:
+        return empty
+
+    params = {
+        f"rule_ids_{i}": list(dict.fromkeys(int(rule_id) for rule_id in rule_ids_by_tenant[tenant]))
+        for i, tenant in enumerate(tenants)
+    }
+    frames = read_union(
+        engine,
+        tenants,
+        f"SELECT {', '.join(columns)} FROM {{schema}}.des_validation_rules_extn WHERE rule_id IN :rule_ids_{{i}}",
+        params=params,
+        expanding=("rule_ids_{i}",)
+    )
+    return {**empty, **frames}
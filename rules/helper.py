@@ -1,28 +1,80 @@
 import re
 import os
+import weakref
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 import pandas as pd
+from .session import use_connection, check_schema, configdb_schema, compile_query
 from .logger import setup_logger
+from .metadata import lookup_metadata_id, get_metadata_map
+from .reference import get_tenant_reference
+from .master_store import MasterStore
 
 logger = setup_logger("helper")
 
 
+# id(master) -> (weakref to master, {RuleID: row position}); entries drop out with their master
+_RULE_INDEXES = {}
+
+
+def build_rule_index(dq_rules_master):
+    rule_ids = dq_rules_master['RuleID']
+    positions = pd.Series(range(len(rule_ids)), index=rule_ids.index)
+    present = rule_ids.notna()
+    
+    # Keep the first occurrence, like the old iloc[0] lookup, but say so loudly
+    duplicated = rule_ids.duplicated(keep=False) & present
+    if duplicated.any():
+        sheets = dq_rules_master.get('SourceSheet', pd.Series('Unknown', index=rule_ids.index))
+        for rule_id, group in sheets[duplicated].groupby(rule_ids[duplicated], sort=True):
+            logger.warning(
+                f"⚠️ Duplicate Rule ID '{rule_id}' in consolidated master "
+                f"(sheets: {', '.join(map(str, group))}). Using the first occurrence."
+            )
+    
+    first = present & ~rule_ids.duplicated(keep='first')
+    return dict(zip(rule_ids[first], positions[first]))
+
+
+def get_rule_index(dq_rules_master):
+    key = id(dq_rules_master)
+    entry = _RULE_INDEXES.get(key)
+    if entry is not None and entry[0]() is dq_rules_master:
+        return entry[1]
+    
+    rule_index = build_rule_index(dq_rules_master)
+    _RULE_INDEXES[key] = (
+        weakref.ref(dq_rules_master, lambda _, key=key: _RULE_INDEXES.pop(key, None)),
+        rule_index
+    )
+    logger.info(f"🔎 Indexed {len(rule_index)} Rule IDs from consolidated master")
+    return rule_index
+
+
+def select_master_rules(dq_rules_master, rule_ids):
+    # The workflows index and slice a DataFrame; a MasterStore hands over just the requested rules
+    if not isinstance(dq_rules_master, MasterStore):
+        return dq_rules_master
+    
+    master_rules = dq_rules_master.fetch_rules(rule_ids)
+    logger.info(f"🗄️  Read {len(master_rules)} rule(s) from the master store")
+    return master_rules
+
+
 def get_rule_from_master(dq_rules_master, rule_id):
-    # dq_rules_master is now a single consolidated DataFrame
+    # dq_rules_master is a single consolidated DataFrame
     if 'RuleID' not in dq_rules_master.columns:
         logger.warning("⚠️ 'RuleID' column not found in consolidated master")
         return None
     
     # Find the rule
-    matching_rules = dq_rules_master[dq_rules_master['RuleID'] == rule_id]
+    position = get_rule_index(dq_rules_master).get(rule_id)
     
-    if matching_rules.empty:
+    if position is None:
         logger.warning(f"⚠️ Rule ID '{rule_id}' not found in consolidated master")
         return None
     
-    # Return the first matching rule (there should only be one)
-    return matching_rules.iloc[0]
+    return dq_rules_master.iloc[position]
 
 
 def get_metadata_id(metadata_type, metadata_value, engine):
@@ -32,83 +84,134 @@ def get_metadata_id(metadata_type, metadata_value, engine):
     if not metadata_value or str(metadata_value).upper() in ['NA', 'NAN', 'NONE', '']:
         return None
     
-    query = text("""
-        SELECT metadata_id 
-        FROM healthfirst_configdb.validation_rule_metadata
-        WHERE UPPER(metadata_set) = UPPER(:metadata_type) 
-        AND UPPER(metadata_value) = UPPER(:metadata_value)
-    """)
-    
     try:
-        with engine.connect() as conn:
-            result = pd.read_sql(query, conn, params={
-                "metadata_type": metadata_type,
-                "metadata_value": metadata_value
-            })
-        
-        if not result.empty:
-            return int(result.iloc[0, 0])
-        else:
-            logger.warning(f"⚠️ Metadata not found: {metadata_type} = {metadata_value}")
-            return None
+        return lookup_metadata_id(metadata_type, metadata_value, engine)
     except Exception as e:
         logger.warning(f"⚠️ Error getting metadata for {metadata_type}={metadata_value}: {e}")
         return None
 
 
-def get_max_rule_id(engine, schema="healthfirst_configdb"):
-    query = f"SELECT COALESCE(MAX(rule_id), 0) AS max_rule_id FROM {schema}.validation_rules"
+def get_metadata_ids(metadata_type, metadata_values, engine):
+    # Column-wise get_metadata_id; returns an object Series of ints / None
+    metadata_type = metadata_set_name(metadata_type)
+    values = metadata_values.astype(object)
+    result = pd.Series([None] * len(values), index=values.index, dtype=object)
     
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn)
+    if is_blank_metadata(values).all():
+        return result
     
-    return int(result["max_rule_id"].iloc[0])
+    try:
+        metadata_map = get_metadata_map(engine)
+    except Exception as e:
+        logger.warning(f"⚠️ Error getting metadata for {metadata_type}: {e}")
+        return result
+    
+    result, missing = map_metadata_values(metadata_type, values, metadata_map)
+    for value in missing:
+        logger.warning(f"⚠️ Metadata not found: {metadata_type} = {value}")
+    return result
 
 
-def get_existing_rule_id(engine, business_rule_id, schema="healthfirst_configdb"):
-    query = text(f"""
-        SELECT rule_id 
-        FROM {schema}.validation_rules 
-        WHERE business_rule_id = :rule_id
-    """)
+def metadata_set_name(metadata_type):
+    # Ingest/UI values are stored under the BOTH metadata set
+    return "BOTH" if metadata_type == "Ingest_Or_UI" else metadata_type
+
+
+def is_blank_metadata(values):
+    values = values.astype(object)
+    return values.isna() | values.astype(str).str.upper().isin(['NA', 'NAN', 'NONE', ''])
+
+
+def map_metadata_values(metadata_type, metadata_values, metadata_map):
+    # Pure lookup against a loaded metadata map: (object Series of ints / None, unique misses)
+    metadata_type = metadata_set_name(metadata_type)
+    values = metadata_values.astype(object)
+    blank = is_blank_metadata(values)
+    result = pd.Series([None] * len(values), index=values.index, dtype=object)
     
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn, params={"rule_id": business_rule_id})
+    metadata_set = metadata_type.upper()
+    set_map = {value: metadata_id for (name, value), metadata_id in metadata_map.items() if name == metadata_set}
     
-    if not result.empty:
-        return int(result["rule_id"].iloc[0])
-    return None
+    ids = values[~blank].astype(str).str.upper().map(set_map)
+    missing = list(values[~blank][ids.isna()].unique())
+    
+    found = ids.notna()
+    result[ids.index[found]] = [int(metadata_id) for metadata_id in ids[found]]
+    return result, missing
+
+
+def fetch_scalar(engine, sql, params=None, expanding=()):
+    # First column of the first row, or None; no DataFrame for a single value
+    with use_connection(engine) as conn:
+        return conn.execute(compile_query(sql, tuple(expanding)), params or {}).scalar()
 
 
-def check_duplicate_rule(engine, business_rule_id, schema="healthfirst_configdb"):
+def get_max_rule_id(engine, schema="healthfirst_configdb"):
+    check_schema(schema)
+    return int(fetch_scalar(engine, f"SELECT COALESCE(MAX(rule_id), 0) AS max_rule_id FROM {schema}.validation_rules"))
+
+
+VALIDATION_RULE_COLUMNS = [
+    "rule_id", "business_rule_id", "rule_category_id", "rule_category_desc",
+    "rule_name", "rule_desc", "rule_type_id", "entity_type_id", "range_type_id",
+    "min", "max", "regex_pattern", "sql_query", "batch_error_message",
+    "ui_error_message_summary", "ui_field_error_message", "endorsement_date",
+    "enabled", "user_name", "sub_entity_type_id", "ingest_or_ui_id",
+    "enforcement_level_id", "error_warning_type_id", "dq_wkflw_ticket_ind"
+]
+
+VALIDATION_RULE_INTEGER_COLUMNS = [
+    "rule_id", "rule_category_id", "rule_type_id", "entity_type_id", "range_type_id",
+    "sub_entity_type_id", "ingest_or_ui_id", "enforcement_level_id", "error_warning_type_id"
+]
+
+
+def restore_integer_columns(df, columns):
+    # read_sql returns a nullable integer column as float64 once any row in the batch is NULL;
+    # Int64 keeps 18 as 18 so it compares equal to the candidate value again
+    for column in columns:
+        if column in df.columns and df[column].dtype.kind == "f":
+            values = df[column]
+            if (values.dropna() % 1 == 0).all():
+                df[column] = values.astype("Int64")
+    return df
+
+
+def fetch_existing_rules(engine, business_rule_ids, schema="healthfirst_configdb"):
+    # One round-trip for the whole batch instead of two queries per rule
+    check_schema(schema)
+    business_rule_ids = list(dict.fromkeys(business_rule_ids))
+    if not business_rule_ids:
+        return pd.DataFrame(columns=VALIDATION_RULE_COLUMNS)
+    
     query = text(f"""
-        SELECT rule_id, business_rule_id, rule_category_id, rule_category_desc,
-               rule_name, rule_desc, rule_type_id, entity_type_id, range_type_id,
-               min, max, regex_pattern, sql_query, batch_error_message,
-               ui_error_message_summary, ui_field_error_message, endorsement_date,
-               enabled, user_name, sub_entity_type_id, ingest_or_ui_id,
-               enforcement_level_id, error_warning_type_id, dq_wkflw_ticket_ind
+        SELECT {", ".join(VALIDATION_RULE_COLUMNS)}
         FROM {schema}.validation_rules
-        WHERE business_rule_id = :business_rule_id
-    """)
+        WHERE business_rule_id IN :business_rule_ids
+    """).bindparams(bindparam("business_rule_ids", expanding=True))
     
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn, params={"business_rule_id": business_rule_id})
+    with use_connection(engine) as conn:
+        result = pd.read_sql(query, conn, params={"business_rule_ids": business_rule_ids})
     
-    return result
+    return restore_integer_columns(result, VALIDATION_RULE_INTEGER_COLUMNS)
+
+
+RULE_COMPARE_FIELDS = [
+    "business_rule_id", "rule_category_id", "rule_category_desc",
+    "rule_name", "rule_desc", "rule_type_id", "entity_type_id",
+    "range_type_id", "min", "max", "regex_pattern", "sql_query",
+    "batch_error_message", "ui_error_message_summary", "ui_field_error_message",
+    "endorsement_date", "enabled", "user_name", "sub_entity_type_id",
+    "ingest_or_ui_id", "enforcement_level_id", "error_warning_type_id",
+    "dq_wkflw_ticket_ind"
+]
 
 
 def compare_rule_data(existing_row, new_row):
-    fields_to_compare = [
-        "business_rule_id", "rule_category_id", "rule_category_desc",
-        "rule_name", "rule_desc", "rule_type_id", "entity_type_id",
-        "range_type_id", "min", "max", "regex_pattern", "sql_query",
-        "batch_error_message", "ui_error_message_summary", "ui_field_error_message",
-        "endorsement_date", "enabled", "user_name", "sub_entity_type_id",
-        "ingest_or_ui_id", "enforcement_level_id", "error_warning_type_id",
-        "dq_wkflw_ticket_ind"
-    ]
-    
+    return _compare_row_fields(existing_row, new_row, RULE_COMPARE_FIELDS)
+
+
+def _compare_row_fields(existing_row, new_row, fields_to_compare):
     for field in fields_to_compare:
         existing_value = existing_row.get(field)
         new_value = new_row.get(field)
@@ -118,144 +221,126 @@ def compare_rule_data(existing_row, new_row):
             continue
         elif pd.isna(existing_value) or pd.isna(new_value):
             return False
-        elif str(existing_value).strip().upper() != str(new_value).strip().upper():
+        elif compare_text(existing_value) != compare_text(new_value):
             return False
     
     return True
 
 
-def get_hrpdm_table_id(engine, table_name, zone, tenant):
-    query = text(f"""
-        SELECT table_id 
-        FROM {tenant}_configdb.des_zone_table_list 
-        WHERE UPPER(table_name) = :table_name 
-        AND process_zone = :zone
-    """)
+def compare_text(value):
+    # A whole float is an integer id read back through a NULL-bearing column; 100.0 compares as 100
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().upper()
+
+
+def normalize_compare_frame(df, fields):
+    # str().strip().upper() for values, None for every kind of null
+    normalized = {}
+    for field in fields:
+        if field not in df.columns:
+            normalized[field] = pd.Series([None] * len(df), index=df.index, dtype=object)
+            continue
+        
+        values = df[field].astype(object)
+        present = values.notna()
+        column = pd.Series([None] * len(df), index=df.index, dtype=object)
+        column[present] = values[present].map(compare_text)
+        normalized[field] = column
     
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn, params={
-            "table_name": table_name.upper(),
-            "zone": zone
-        })
+    return pd.DataFrame(normalized, index=df.index)
+
+
+def compare_frames(existing_df, new_df, fields):
+    # Row-aligned (same index) comparison of existing DB rows against candidate rows.
+    # Returns is_identical plus the list of fields that would change for each row.
+    existing = normalize_compare_frame(existing_df, fields)
+    new = normalize_compare_frame(new_df, fields)
+    
+    changed = pd.DataFrame(index=new.index)
+    for field in fields:
+        existing_values, new_values = existing[field], new[field]
+        both_null = existing_values.isna() & new_values.isna()
+        same = existing_values.notna() & new_values.notna() & (existing_values == new_values)
+        changed[field] = ~(both_null | same)
     
-    if not result.empty:
-        return int(result.iloc[0, 0])
+    changed_fields = [
+        [field for field, is_changed in zip(fields, row) if is_changed]
+        for row in changed.to_numpy(dtype=bool)
+    ]
+    return pd.DataFrame({
+        "is_identical": ~changed.any(axis=1),
+        "changed_fields": changed_fields
+    }, index=new.index)
+
+
+def get_hrpdm_table_id(engine, table_name, zone, tenant):
+    table_id = get_tenant_reference(tenant).get_table_id(engine, table_name, zone)
+    
+    if table_id is not None:
+        return table_id
     else:
         logger.warning(f"⚠️ Table {table_name} not found in {zone} zone for tenant {tenant}")
         return None
 
 
 def get_entity_info(engine, entity_type, tenant):
-    query = text(f"""
-        SELECT pdm_entity_id, entity_key_field_name  
-        FROM {tenant}_configdb.pdm_entity_master 
-        WHERE UPPER(entity_name) = :entity_type
-    """)
+    entity_info = get_tenant_reference(tenant).get_entity_info(engine, entity_type)
     
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn, params={"entity_type": entity_type.upper()})
-    
-    if not result.empty:
-        return int(result.iloc[0, 0]), result.iloc[0, 1]
+    if entity_info is not None:
+        return entity_info
     else:
         logger.warning(f"⚠️ Entity {entity_type} not found for tenant {tenant}")
         return None, None
 
 
 def get_max_rule_extn_id(engine, tenant, source_owner=None):
+    schema = configdb_schema(tenant)
     if source_owner:
-        query = f"""
-            SELECT COALESCE(MAX(rule_extn_id), 0) AS max_rule_id 
-            FROM {tenant}_configdb.des_validation_rules_extn 
-            WHERE UPPER(source_owner_name) = '{source_owner.upper()}'
-        """
-    else:
-        query = f"""
+        return int(fetch_scalar(engine, f"""
             SELECT COALESCE(MAX(rule_extn_id), 0) AS max_rule_id 
-            FROM {tenant}_configdb.des_validation_rules_extn
-        """
-    
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn)
+            FROM {schema}.des_validation_rules_extn 
+            WHERE UPPER(source_owner_name) = :source_owner_name
+        """, {"source_owner_name": source_owner.upper()}))
     
-    return int(result["max_rule_id"].iloc[0])
+    return int(fetch_scalar(engine, f"""
+        SELECT COALESCE(MAX(rule_extn_id), 0) AS max_rule_id 
+        FROM {schema}.des_validation_rules_extn
+    """))
 
 
-def get_existing_rule_extn_id(engine, rule_id, source_owner, tenant):
-    query = text(f"""
-        SELECT rule_extn_id 
-        FROM {tenant}_configdb.des_validation_rules_extn 
-        WHERE rule_id = :rule_id 
-        AND UPPER(source_owner_name) = :source_owner_name
-    """)
-    
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn, params={
-            "rule_id": rule_id,
-            "source_owner_name": source_owner.upper()
-        })
-    
-    if not result.empty:
-        return int(result.iloc[0, 0])
-    return None
+RULE_EXTN_COLUMNS = [
+    "rule_extn_id", "rule_id", "task_id", "rule_applied_zone", "hrpdm_table_id",
+    "hrpdm_column_names", "source_table_id", "source_column_names", "sql_query",
+    "active_flag", "implmnt_type", "implmnt_order", "reference_codeset_id",
+    "entity_key", "pdm_entity_id", "source_owner_name"
+]
 
+RULE_EXTN_INTEGER_COLUMNS = [
+    "rule_extn_id", "rule_id", "task_id", "hrpdm_table_id", "source_table_id",
+    "implmnt_order", "reference_codeset_id", "pdm_entity_id"
+]
 
-def check_duplicate_config(engine, rule_id, source_owner, tenant):
-    query = text(f"""
-        SELECT rule_extn_id, rule_id, task_id, rule_applied_zone, hrpdm_table_id, 
-               hrpdm_column_names, source_table_id, source_column_names, sql_query,
-               active_flag, implmnt_type, implmnt_order, reference_codeset_id,
-               entity_key, pdm_entity_id, source_owner_name
-        FROM {tenant}_configdb.des_validation_rules_extn 
-        WHERE rule_id = :rule_id 
-        AND UPPER(source_owner_name) = :source_owner_name
-    """)
-    
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn, params={
-            "rule_id": rule_id,
-            "source_owner_name": source_owner.upper()
-        })
-    
-    return result
 
-
-def compare_config_data(existing_row, new_row):
-    fields_to_compare = [
-        "rule_id", "task_id", "rule_applied_zone", "hrpdm_table_id",
-        "hrpdm_column_names", "source_table_id", "source_column_names", 
-        "sql_query", "active_flag", "implmnt_type", "implmnt_order",
-        "reference_codeset_id", "entity_key", "pdm_entity_id", "source_owner_name"
-    ]
-    
-    for field in fields_to_compare:
-        existing_value = existing_row.get(field)
-        new_value = new_row.get(field)
-        
-        # Handle None/NaN comparisons
-        if pd.isna(existing_value) and pd.isna(new_value):
-            continue
-        elif pd.isna(existing_value) or pd.isna(new_value):
-            return False
-        elif str(existing_value).strip().upper() != str(new_value).strip().upper():
-            return False
-    
-    return True
+CONFIG_COMPARE_FIELDS = [
+    "rule_id", "task_id", "rule_applied_zone", "hrpdm_table_id",
+    "hrpdm_column_names", "source_table_id", "source_column_names", 
+    "sql_query", "active_flag", "implmnt_type", "implmnt_order",
+    "reference_codeset_id", "entity_key", "pdm_entity_id", "source_owner_name"
+]
 
 
 def get_source_table_id(engine, source_owner, tenant):
-    query = text(f"""
-        SELECT DISTINCT source_table_id 
-        FROM {tenant}_configdb.des_validation_rules_extn 
-        WHERE source_owner_name = :source_owner_name
-    """)
-    
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn, params={"source_owner_name": source_owner.upper()})
-    
-    if not result.empty:
-        return ','.join(result.iloc[:, 0].astype(str))
-    return None
+    return get_tenant_reference(tenant).get_source_table_id(engine, source_owner)
+
+
+ENTITY_TYPE_MAP = {
+    "LOCATION_ORGANIZATION": "ORGANIZATION_LOCATION"
+}
+
+SUB_ENTITY_MAP = {
+    "LOCATION ORGANIZATION": "ORGANIZATION AND LOCATION ORGANIZATION"
+}
 
 
 def extract_column_value(row, *possible_keys):
@@ -265,24 +350,40 @@ def extract_column_value(row, *possible_keys):
     return ""
 
 
-def standardize_entity_type(entity_type):
-    entity_type = str(entity_type).strip().upper().replace(" ", "_")
+def extract_column_values(df, *possible_keys):
+    # Column-wise extract_column_value: first non-null candidate per row, stripped, "" if none
+    result = pd.Series("", index=df.index, dtype=object)
+    filled = pd.Series(False, index=df.index)
     
-    entity_type_map = {
-        "LOCATION_ORGANIZATION": "ORGANIZATION_LOCATION"
-    }
+    for key in possible_keys:
+        if key not in df.columns:
+            continue
+        values = df[key].astype(object)
+        take = ~filled & values.notna()
+        result[take] = values[take].astype(str).str.strip()
+        filled |= take
     
-    return entity_type_map.get(entity_type, entity_type)
+    return result
+
+
+def standardize_entity_type(entity_type):
+    entity_type = str(entity_type).strip().upper().replace(" ", "_")
+    return ENTITY_TYPE_MAP.get(entity_type, entity_type)
+
+
+def standardize_entity_types(entity_types):
+    entity_types = entity_types.astype(str).str.strip().str.upper().str.replace(" ", "_", regex=False)
+    return entity_types.replace(ENTITY_TYPE_MAP)
 
 
 def standardize_sub_entity(sub_entity):
     sub_entity = str(sub_entity).strip().upper()
-    
-    sub_entity_map = {
-        "LOCATION ORGANIZATION": "ORGANIZATION AND LOCATION ORGANIZATION"
-    }
-    
-    return sub_entity_map.get(sub_entity, sub_entity)
+    return SUB_ENTITY_MAP.get(sub_entity, sub_entity)
+
+
+def standardize_sub_entities(sub_entities):
+    sub_entities = sub_entities.astype(str).str.strip().str.upper()
+    return sub_entities.replace(SUB_ENTITY_MAP)
 
 
 def get_version_info(base_dir: str):
@@ -326,13 +427,17 @@ def get_version_info_extn(base_dir: str):
 
 
 def get_hrp_source_table_id(engine, tenant, entity_type, hepdm_table):
-    query = f"""select source_table_id from
-        {tenant}_configdb.cdi_mapping_table cmt
+    schema = configdb_schema(tenant)
+    query = compile_query(f"""select source_table_id from
+        {schema}.cdi_mapping_table cmt
         join
-       {tenant}_configdb.cdi_definition cd
+       {schema}.cdi_definition cd
         on cmt.ingestion_id= cd.ingestion_id
-        where upper(hrpdm_table_name) like '%{hepdm_table}%'
-        and cd.source_name ='HRP'and  upper(entity_name) = '{entity_type}'
-        and q"""
-    return pd.read_sql(query, engine)
+        where upper(hrpdm_table_name) like :hrpdm_table_pattern
+        and cd.source_name ='HRP'and  upper(entity_name) = :entity_type""")
+    with use_connection(engine) as conn:
+        return pd.read_sql(query, conn, params={
+            "hrpdm_table_pattern": f"%{hepdm_table}%",
+            "entity_type": entity_type
+        })
 
@@ -0,0 +1,321 @@
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+import pandas as pd
+from config import ID_LEDGER_PATH, ID_LEDGER_LOCK_TIMEOUT_SECONDS, ID_LEDGER_LOCK_STALE_SECONDS, TENANT_DATA_FOLDER_PATHS
+from .helper import get_max_rule_id, get_max_rule_extn_id
+from .logger import setup_logger
+
+logger = setup_logger("id_allocator")
+
+RULES_CHANGELOG_PATTERN = re.compile(r"load_validation_rules_data_ver_\d+_\d+_\d+\.csv$")
+EXTN_CHANGELOG_PATTERN = re.compile(r"load_des_validation_rules_extn_data_ver_\d+_\d+_\d+\.csv$")
+
+# Guards the ledger between threads; the lock file guards it between processes
+_THREAD_LOCK = threading.Lock()
+# Reservations made inside the current thread's id_reservations() block
+_ACTIVE = threading.local()
+
+# One reserved block: its last id, the counter's value before it, and [(also-raised counter, its value before)]
+Reservation = namedtuple("Reservation", ["counter", "last", "previous", "raised"])
+
+
+def database_key(engine):
+    # Counters are kept per database, so one ledger can serve Postgres and any SQLite snapshot
+    return engine.engine.url.render_as_string(hide_password=True)
+
+
+def rule_counter(database):
+    return f"{database}#validation_rules:common"
+
+
+def extn_counter(database, tenant, source_owner=None):
+    return f"{database}#des_validation_rules_extn:{tenant}:{'HRP' if source_owner == 'HRP' else 'ALL'}"
+
+
+def allocate_rule_ids(engine, count):
+    # First id of a reserved contiguous block of `count` validation_rules.rule_id values
+    return _reserve(
+        rule_counter(database_key(engine)),
+        count,
+        lambda: get_max_rule_id(engine),
+        lambda ledger: _changelog_max(ledger, TENANT_DATA_FOLDER_PATHS["common"], RULES_CHANGELOG_PATTERN)["rule_id"]
+    )
+
+
+def allocate_rule_extn_ids(engine, tenant, hrp_count, other_count):
+    # (first HRP id, first non-HRP id). HRP ids come from their own sequence; every id
+    # handed out, HRP or not, moves the overall sequence past it, as the old counters did.
+    folder = TENANT_DATA_FOLDER_PATHS[tenant]
+    database = database_key(engine)
+    hrp_counter = extn_counter(database, tenant, "HRP")
+    overall_counter = extn_counter(database, tenant)
+
+    first_hrp = _reserve(
+        hrp_counter,
+        hrp_count,
+        lambda: get_max_rule_extn_id(engine, tenant, source_owner="HRP"),
+        lambda ledger: _changelog_max(ledger, folder, EXTN_CHANGELOG_PATTERN)["hrp"],
+        also_raise=overall_counter
+    )
+    first_other = _reserve(
+        overall_counter,
+        other_count,
+        lambda: get_max_rule_extn_id(engine, tenant),
+        lambda ledger: _changelog_max(ledger, folder, EXTN_CHANGELOG_PATTERN)["rule_extn_id"]
+    )
+    return first_hrp, first_other
+
+
+class id_reservations:
+    """Give back the ids reserved in this block unless ``keep()`` is called.
+
+    A workflow calls ``keep()`` once its changelog CSV is written; if it fails
+    or returns before that, each block is released again as long as no later
+    reservation was stacked on top of it, so the next run reuses those ids.
+    """
+
+    def __init__(self):
+        self.reservations = []
+        self.kept = False
+
+    def __enter__(self):
+        self.previous = getattr(_ACTIVE, "reservations", None)
+        _ACTIVE.reservations = self.reservations
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _ACTIVE.reservations = self.previous
+        if not self.kept and self.reservations:
+            _release(self.reservations)
+        return False
+
+    def keep(self):
+        self.kept = True
+
+
+def _reserve(counter, count, load_db_max, load_changelog_max, also_raise=None):
+    # MAX() is read fresh every time so ids committed from other machines are never reused.
+    # It is a primary-key lookup, and it runs before taking the lock to keep the lock held briefly;
+    # the ledger only stacks local reservations and unmerged changelogs on top of it.
+    db_max = int(load_db_max())
+
+    with _locked_ledger() as ledger:
+        entry = _counter_entry(ledger, counter)
+        first = max(entry["reserved"], db_max, load_changelog_max(ledger)) + 1
+        if count > 0:
+            previous = entry["reserved"]
+            entry["reserved"] = first + count - 1
+            logger.info(f"🔢 Reserved {counter} ids {first}-{entry['reserved']}")
+
+            raised = []
+            if also_raise is not None:
+                other = _counter_entry(ledger, also_raise)
+                if other["reserved"] < entry["reserved"]:
+                    raised.append((also_raise, other["reserved"]))
+                    other["reserved"] = entry["reserved"]
+
+            active = getattr(_ACTIVE, "reservations", None)
+            if active is not None:
+                active.append(Reservation(counter, entry["reserved"], previous, raised))
+
+        return first
+
+
+def _release(reservations):
+    # Newest first, so a block is only rolled back once everything stacked on it in this run is
+    with _locked_ledger() as ledger:
+        for reservation in reversed(reservations):
+            entry = _counter_entry(ledger, reservation.counter)
+            if entry["reserved"] != reservation.last:
+                logger.info(f"🔢 Leaving {reservation.counter} ids up to {reservation.last} reserved; later ids were handed out")
+                continue
+            entry["reserved"] = reservation.previous
+            logger.info(f"🔢 Released {reservation.counter} ids {reservation.previous + 1}-{reservation.last}")
+            for counter, previous in reservation.raised:
+                other = _counter_entry(ledger, counter)
+                if other["reserved"] == reservation.last:
+                    other["reserved"] = previous
+
+
+def _counter_entry(ledger, counter):
+    return ledger["counters"].setdefault(counter, {"reserved": 0})
+
+
+def _changelog_max(ledger, folder, pattern):
+    # Highest ids in changelog CSVs that may not be merged into the database yet.
+    # Each file is read once and remembered by size and mtime.
+    maxima = {"rule_id": 0, "rule_extn_id": 0, "hrp": 0}
+    if not folder or not os.path.isdir(folder):
+        return maxima
+
+    for name in os.listdir(folder):
+        if not pattern.match(name):
+            continue
+        path = os.path.join(folder, name)
+        stat = os.stat(path)
+        cached = ledger["files"].get(path)
+        if cached is None or cached["mtime_ns"] != stat.st_mtime_ns or cached["size"] != stat.st_size:
+            cached = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "max": _read_changelog_max(path)}
+            ledger["files"][path] = cached
+        for key, value in cached["max"].items():
+            maxima[key] = max(maxima[key], value)
+
+    return maxima
+
+
+def _read_changelog_max(path):
+    try:
+        data = pd.read_csv(path, dtype=str, keep_default_na=False)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read changelog {path} for id allocation: {e}")
+        return {}
+
+    def column_max(values):
+        ids = pd.to_numeric(values, errors="coerce").dropna()
+        return int(ids.max()) if not ids.empty else 0
+
+    maxima = {}
+    if "rule_extn_id" in data.columns:
+        maxima["rule_extn_id"] = column_max(data["rule_extn_id"])
+        if "source_owner_name" in data.columns:
+            maxima["hrp"] = column_max(data.loc[data["source_owner_name"].str.upper() == "HRP", "rule_extn_id"])
+    elif "rule_id" in data.columns:
+        maxima["rule_id"] = column_max(data["rule_id"])
+    return maxima
+
+
+@contextmanager
+def _locked_ledger():
+    with _THREAD_LOCK, _file_lock(f"{ID_LEDGER_PATH}.lock"):
+        ledger = _read_ledger()
+        yield ledger
+        _write_ledger(ledger)
+
+
+@contextmanager
+def _file_lock(lock_path, poll_seconds=0.05):
+    # O_EXCL lock file works the same on Windows and POSIX. It records who holds it, so a
+    # waiter only breaks a lock whose holder is gone and the holder only removes its own lock.
+    token = f"{socket.gethostname()} {os.getpid()} {uuid.uuid4().hex}"
+    deadline = time.monotonic() + ID_LEDGER_LOCK_TIMEOUT_SECONDS
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                _break_stale_lock(lock_path)
+                deadline = time.monotonic() + ID_LEDGER_LOCK_TIMEOUT_SECONDS
+            time.sleep(poll_seconds)
+
+    try:
+        os.write(fd, token.encode("utf-8"))
+        os.close(fd)
+        yield
+    finally:
+        if _read_lock(lock_path) == token:
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+        else:
+            logger.warning(f"⚠️ Id ledger lock {lock_path} was taken over while held; leaving it in place")
+
+
+def _break_stale_lock(lock_path):
+    seen = _read_lock(lock_path)
+    try:
+        age = time.time() - os.stat(lock_path).st_mtime
+    except FileNotFoundError:
+        return
+    if seen is None or (_holder_alive(seen) and age < ID_LEDGER_LOCK_STALE_SECONDS):
+        logger.warning(f"⏳ Still waiting for id ledger lock {lock_path} held by {seen or 'a starting process'}")
+        return
+
+    # Move it aside first: only one waiter can win the rename, and the lock it moved must be
+    # the one judged stale, not a fresh one taken in between
+    aside = f"{lock_path}.{uuid.uuid4().hex}.stale"
+    try:
+        os.rename(lock_path, aside)
+    except FileNotFoundError:
+        return
+    if _read_lock(aside) != seen:
+        try:
+            os.link(aside, lock_path)
+        except OSError:
+            logger.warning(f"⚠️ Could not restore id ledger lock {lock_path} moved aside by mistake")
+    else:
+        logger.warning(f"⚠️ Taking over stale id ledger lock {lock_path} held by {seen} for {age:.0f}s")
+    os.remove(aside)
+
+
+def _read_lock(lock_path):
+    # None for a lock that does not exist or whose holder has not written its token yet
+    try:
+        with open(lock_path, "r", encoding="utf-8") as f:
+            return f.read() or None
+    except FileNotFoundError:
+        return None
+
+
+def _holder_alive(token):
+    host, pid = token.split()[:2]
+    if host != socket.gethostname():
+        # A holder on another machine (shared ledger folder) can only be judged by the lock's age
+        return True
+    return _pid_alive(int(pid))
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        # os.kill(pid, 0) would terminate the process on Windows; ask for its exit code instead
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5  # ERROR_ACCESS_DENIED: exists, owned by someone else
+        try:
+            exit_code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_ledger():
+    try:
+        with open(ID_LEDGER_PATH, "r", encoding="utf-8") as f:
+            ledger = json.load(f)
+    except FileNotFoundError:
+        ledger = {}
+    except ValueError as e:
+        # Counters are rebuilt from the database and changelogs, so a bad ledger only costs a rescan
+        logger.warning(f"⚠️ Ignoring unreadable id ledger {ID_LEDGER_PATH}: {e}")
+        ledger = {}
+
+    ledger.setdefault("counters", {})
+    ledger.setdefault("files", {})
+    return ledger
+
+
+def _write_ledger(ledger):
+    os.makedirs(os.path.dirname(ID_LEDGER_PATH) or ".", exist_ok=True)
+    tmp_path = f"{ID_LEDGER_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(ledger, f, indent=2)
+    os.replace(tmp_path, ID_LEDGER_PATH)
@@ -1,5 +1,8 @@
 import logging
+import multiprocessing
 import sys
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
 # Create logs directory if it doesn't exist
@@ -10,8 +13,23 @@ os.makedirs(LOGS_DIR, exist_ok=True)
 # Single log file that gets replaced on each action
 LOG_FILE = os.path.join(LOGS_DIR, "automation.log")
 
+# One handler, and so one open file, shared by every logger; created on first use in the parent process
+_FILE_HANDLER = None
+_FILE_HANDLER_LOCK = threading.Lock()
+
+
 def reset_log_file():
-    global LOG_FILE
+    # Start a new log for this action; the open handler is truncated instead of deleting the file under it
+    if _FILE_HANDLER is not None:
+        _FILE_HANDLER.acquire()
+        try:
+            if _FILE_HANDLER.stream is not None:
+                _FILE_HANDLER.stream.close()
+            _FILE_HANDLER.stream = _FILE_HANDLER._open()
+        finally:
+            _FILE_HANDLER.release()
+        return
+    
     # Delete the old log file if it exists
     if os.path.exists(LOG_FILE):
         try:
@@ -20,6 +38,36 @@ def reset_log_file():
             pass  # If file is in use, just overwrite it
 
 
+def _get_file_handler():
+    global _FILE_HANDLER
+    with _FILE_HANDLER_LOCK:
+        if _FILE_HANDLER is None:
+            # Write mode - new file each session, clean formatting. Opened on the first record, so
+            # importing this module never truncates the log.
+            file_handler = logging.FileHandler(LOG_FILE, mode='w', encoding='utf-8', delay=True)
+            file_handler.setLevel(logging.DEBUG)
+            file_formatter = FileFormatter(
+                fmt='%(asctime)s - %(levelname)-8s - %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
+            file_handler.setFormatter(file_formatter)
+            _FILE_HANDLER = file_handler
+        return _FILE_HANDLER
+
+
+# Per-thread record buffer used to keep concurrent work (e.g. one tenant) grouped in the log
+_THREAD_STATE = threading.local()
+
+
+class BufferedLogFilter(logging.Filter):
+    def filter(self, record):
+        buffer = getattr(_THREAD_STATE, "buffer", None)
+        if buffer is None or getattr(record, "replayed", False):
+            return True
+        buffer.append(record)
+        return False
+
+
 class ColoredConsoleFormatter(logging.Formatter):    
     def format(self, record):
         # Keep the original message with emojis
@@ -35,6 +83,9 @@ def setup_logger(name="dq_automation"):
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
     
+    if not any(isinstance(f, BufferedLogFilter) for f in logger.filters):
+        logger.addFilter(BufferedLogFilter())
+    
     # Clear any existing handlers
     if logger.hasHandlers():
         logger.handlers.clear()
@@ -48,22 +99,41 @@ def setup_logger(name="dq_automation"):
     )
     console_handler.setFormatter(console_formatter)
     
-    # File handler (write mode - new file each session, clean formatting)
-    file_handler = logging.FileHandler(LOG_FILE, mode='w', encoding='utf-8')
-    file_handler.setLevel(logging.DEBUG)
-    file_formatter = FileFormatter(
-        fmt='%(asctime)s - %(levelname)-8s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    file_handler.setFormatter(file_formatter)
-    
     # Add handlers
     logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    
+    # Worker processes import this module too; opening the run log there would truncate it,
+    # so only the parent writes the file and workers hand their records back (see master_loader)
+    if multiprocessing.parent_process() is None:
+        logger.addHandler(_get_file_handler())
     
     return logger
 
 
+@contextmanager
+def buffered_logs():
+    # Hold every record logged by this thread until flush_buffered_logs() is called
+    previous = getattr(_THREAD_STATE, "buffer", None)
+    records = []
+    _THREAD_STATE.buffer = records
+    try:
+        yield records
+    finally:
+        _THREAD_STATE.buffer = previous
+
+
+def flush_buffered_logs(records):
+    # Nested buffers hand their records to the enclosing one so grouping is preserved
+    outer = getattr(_THREAD_STATE, "buffer", None)
+    if outer is not None:
+        outer.extend(records)
+        return
+    
+    for record in records:
+        record.replayed = True
+        logging.getLogger(record.name).handle(record)
+
+
 def log_separator(logger, char="-", length=40):
     logger.info(char * length)
 
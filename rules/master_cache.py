@@ -0,0 +1,190 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import threading
+from .logger import setup_logger
+
+logger = setup_logger("master_cache")
+
+# Binary sidecar written next to the uploaded workbook, e.g.
+# uploads/dq_rules_master.<hash>.v3.master.pkl
+SIDECAR_SUFFIX = ".master.pkl"
+DIRECTORY_SUFFIX = ".rules.json"
+STORE_SUFFIX = ".master.sqlite"
+# Bump whenever the shape of the consolidated master changes so old sidecars are ignored
+CACHE_FORMAT_VERSION = 3
+
+# Consolidated masters for the most recently loaded file, keyed by (content hash, variant).
+# The "all" variant holds every sheet; lazy loads add one variant per sheet subset.
+_MASTER_CACHE = {}
+# content hash -> {RuleID: sheet name}
+_DIRECTORY_CACHE = {}
+# path -> (mtime_ns, size, sha256) so unchanged files are not re-hashed on every POST
+_HASH_MEMO = {}
+_CACHE_LOCK = threading.RLock()
+
+
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    stat = os.stat(file_path)
+    memo = _HASH_MEMO.get(file_path)
+    if memo and memo[0] == stat.st_mtime_ns and memo[1] == stat.st_size:
+        return memo[2]
+
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+
+    file_hash = sha.hexdigest()
+    _HASH_MEMO[file_path] = (stat.st_mtime_ns, stat.st_size, file_hash)
+    return file_hash
+
+
+def get_sidecar_path(file_path, file_hash, variant="all"):
+    base, _ = os.path.splitext(file_path)
+    tag = "" if variant == "all" else f".{variant}"
+    return f"{base}.{file_hash[:16]}.v{CACHE_FORMAT_VERSION}{tag}{SIDECAR_SUFFIX}"
+
+
+def get_directory_path(file_path, file_hash):
+    base, _ = os.path.splitext(file_path)
+    return f"{base}.{file_hash[:16]}.v{CACHE_FORMAT_VERSION}{DIRECTORY_SUFFIX}"
+
+
+def get_store_path(file_path, file_hash):
+    base, _ = os.path.splitext(file_path)
+    return f"{base}.{file_hash[:16]}.v{CACHE_FORMAT_VERSION}{STORE_SUFFIX}"
+
+
+def is_master_cached(file_path, variant="all"):
+    with _CACHE_LOCK:
+        file_hash = compute_file_hash(file_path)
+        return (file_hash, variant) in _MASTER_CACHE or os.path.exists(get_sidecar_path(file_path, file_hash, variant))
+
+
+def load_cached_master(file_path, builder, variant="all"):
+    with _CACHE_LOCK:
+        file_hash = compute_file_hash(file_path)
+        
+        # 1. In-process cache
+        master = _MASTER_CACHE.get((file_hash, variant))
+        if master is not None:
+            logger.info(f"⚡ Using in-memory DQ master cache ({file_hash[:12]}, {variant})")
+            return master
+        
+        # 2. Sidecar from a previous run
+        sidecar_path = get_sidecar_path(file_path, file_hash, variant)
+        master = _read_sidecar(sidecar_path)
+        
+        # 3. Full Excel parse
+        if master is None:
+            logger.info(f"🐢 No cache for DQ master ({file_hash[:12]}, {variant}), parsing Excel...")
+            master = builder(file_path)
+            _write_sidecar(master, sidecar_path)
+        
+        # Only keep entries for the current file
+        for key in [key for key in _MASTER_CACHE if key[0] != file_hash]:
+            del _MASTER_CACHE[key]
+        _MASTER_CACHE[(file_hash, variant)] = master
+        return master
+
+
+def peek_cached_master(file_path, variant="all"):
+    # Cached master for the file as it is on disk now, without ever parsing it
+    with _CACHE_LOCK:
+        file_hash = compute_file_hash(file_path)
+        master = _MASTER_CACHE.get((file_hash, variant))
+        if master is None:
+            master = _read_sidecar(get_sidecar_path(file_path, file_hash, variant))
+        return master
+
+
+def store_cached_master(file_path, master, directory=None):
+    # Install a master built outside load_cached_master (e.g. patched on re-upload)
+    with _CACHE_LOCK:
+        file_hash = compute_file_hash(file_path)
+        _write_sidecar(master, get_sidecar_path(file_path, file_hash))
+        _MASTER_CACHE.clear()
+        _MASTER_CACHE[(file_hash, "all")] = master
+        
+        if directory is not None:
+            _write_directory(directory, get_directory_path(file_path, file_hash))
+            _DIRECTORY_CACHE.clear()
+            _DIRECTORY_CACHE[file_hash] = directory
+
+
+def load_cached_rule_directory(file_path, builder):
+    with _CACHE_LOCK:
+        file_hash = compute_file_hash(file_path)
+        directory = _DIRECTORY_CACHE.get(file_hash)
+        if directory is not None:
+            return directory
+        
+        directory_path = get_directory_path(file_path, file_hash)
+        try:
+            with open(directory_path, "r", encoding="utf-8") as f:
+                # Stored as [rule_id, sheet] pairs so numeric RuleIDs keep their type
+                directory = dict(json.load(f))
+        except (OSError, ValueError):
+            directory = builder(file_path)
+            _write_directory(directory, directory_path)
+        
+        _DIRECTORY_CACHE.clear()
+        _DIRECTORY_CACHE[file_hash] = directory
+        return directory
+
+
+def invalidate_master_cache(file_path):
+    with _CACHE_LOCK:
+        _MASTER_CACHE.clear()
+        _DIRECTORY_CACHE.clear()
+        _HASH_MEMO.pop(file_path, None)
+
+        base, _ = os.path.splitext(file_path)
+        stale = [
+            path
+            for suffix in (SIDECAR_SUFFIX, DIRECTORY_SUFFIX, STORE_SUFFIX)
+            for path in glob.glob(f"{glob.escape(base)}.*{suffix}")
+        ]
+        for sidecar_path in stale:
+            try:
+                os.remove(sidecar_path)
+                logger.info(f"🗑️  Removed stale master cache: {sidecar_path}")
+            except OSError as e:
+                logger.warning(f"⚠️ Could not remove stale master cache {sidecar_path}: {e}")
+
+
+def _read_sidecar(sidecar_path):
+    if not os.path.exists(sidecar_path):
+        return None
+
+    try:
+        with open(sidecar_path, "rb") as f:
+            master = pickle.load(f)
+        logger.info(f"⚡ Loaded DQ master from cache file: {sidecar_path}")
+        return master
+    except Exception as e:
+        logger.warning(f"⚠️ Ignoring unreadable master cache {sidecar_path}: {e}")
+        return None
+
+
+def _write_sidecar(master, sidecar_path):
+    # Write to a temp file first so a crash never leaves a truncated sidecar behind
+    tmp_path = f"{sidecar_path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(master, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, sidecar_path)
+        logger.info(f"💾 Saved DQ master cache: {sidecar_path}")
+    except OSError as e:
+        logger.warning(f"⚠️ Could not write master cache {sidecar_path}: {e}")
+
+
+def _write_directory(directory, directory_path):
+    try:
+        with open(directory_path, "w", encoding="utf-8") as f:
+            json.dump(list(directory.items()), f)
+    except (OSError, TypeError) as e:
+        logger.warning(f"⚠️ Could not write rule directory {directory_path}: {e}")
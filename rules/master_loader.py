@@ -0,0 +1,262 @@
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import load_workbook
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from .logger import setup_logger, buffered_logs, flush_buffered_logs
+
+logger = setup_logger("master_loader")
+
+MASTER_SHEETS = [
+    'Provider Network',
+    'Practitioner',
+    'Organization',
+    'Address',
+    'Network'
+]
+
+# Column name mappings to standardize
+COLUMN_MAPPINGS = {
+    'Rule ID': 'RuleID',
+    'RuleID': 'RuleID',
+    'rule id': 'RuleID',
+    'ruleid': 'RuleID',
+    'Rule Type': 'RuleType',
+    'Rule type': 'RuleType',
+    'Rule Category': 'RuleType',
+    'rule type': 'RuleType',
+    'rule category': 'RuleType',
+    'Sub Entity': 'SubEntity',
+    'Sub-Entity': 'SubEntity',
+    'sub entity': 'SubEntity',
+    'sub-entity': 'SubEntity',
+    'Ingest+UI/UI Only': 'IngestUIOnly',
+    'Ingest+UI/Ui Only': 'IngestUIOnly',
+    'Ingest+UI/UI only': 'IngestUIOnly',
+    'ingest+ui/ui only': 'IngestUIOnly',
+    'Column Name': 'ColumnName',
+    'column name': 'ColumnName',
+    'Table Name': 'TableName',
+    'table name': 'TableName',
+    'Rule Name': 'RuleName',
+    'rule name': 'RuleName',
+    'Rule Description': 'RuleDescription',
+    'rule description': 'RuleDescription'
+}
+
+# Only the (standardized) columns the add/update and configure workflows read
+MASTER_COLUMNS = [
+    'RuleID',
+    'RuleType',
+    'Entity',
+    'SubEntity',
+    'IngestUIOnly',
+    'TableName',
+    'ColumnName',
+    'RuleName',
+    'RuleDescription',
+    'Interface( Batch, API) ingestion Error Message',
+    'UI Error Message Summary',
+    'UI Error Message Under Field',
+    'Enforcement Level',
+    'Date Updated'
+]
+
+# Few distinct values across thousands of rows; stored as pandas categoricals
+CATEGORICAL_COLUMNS = [
+    'SourceSheet',
+    'RuleType',
+    'Entity',
+    'SubEntity',
+    'IngestUIOnly',
+    'TableName',
+    'Enforcement Level'
+]
+
+
+# Strings pd.read_excel treats as missing by default
+NA_STRINGS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+}
+
+
+def standardize_column_name(column):
+    column = str(column).strip()
+    return COLUMN_MAPPINGS.get(column, column)
+
+
+def read_sheet_columns(workbook, sheet_name, columns=MASTER_COLUMNS):
+    worksheet = workbook[sheet_name]
+    # Some writers store a wrong <dimension>; recompute so no rows are cut off
+    worksheet.reset_dimensions()
+    rows = worksheet.iter_rows(values_only=True)
+
+    header = next(rows, None)
+    if header is None:
+        return {column: [] for column in columns}
+
+    # Map standardized column name -> cell position; first occurrence wins
+    positions = {}
+    for position, name in enumerate(header):
+        if name is None:
+            continue
+        positions.setdefault(standardize_column_name(name), position)
+
+    wanted = [(column, positions.get(column)) for column in columns]
+    values = {column: [] for column in columns}
+
+    for row in rows:
+        # Fully blank rows are skipped, as pd.read_excel does
+        if all(cell is None or cell == "" for cell in row):
+            continue
+        for column, position in wanted:
+            cell = row[position] if position is not None and position < len(row) else None
+            values[column].append(normalize_cell(cell))
+
+    return values
+
+
+def normalize_cell(cell):
+    # Match read_excel: NA markers become missing, whole-number floats become ints
+    if isinstance(cell, str):
+        return None if cell in NA_STRINGS else cell
+    if isinstance(cell, float):
+        if cell != cell:
+            return None
+        return int(cell) if cell.is_integer() else cell
+    if cell is pd.NaT:
+        return None
+    return cell
+
+
+def frame_sheet_values(frame, columns=MASTER_COLUMNS):
+    # Inverse of build_master_frame for one sheet's rows, so they can be re-encoded as parsed
+    return {column: [normalize_cell(cell) for cell in frame[column].tolist()] for column in columns}
+
+
+def build_rule_directory(dq_file_path, sheet_names=MASTER_SHEETS):
+    # RuleID -> sheet, reading only the RuleID column of each sheet
+    workbook = load_workbook(dq_file_path, read_only=True, data_only=True)
+    directory = {}
+    
+    try:
+        for sheet_name in sheet_names:
+            worksheet = workbook[sheet_name]
+            worksheet.reset_dimensions()
+            header = next(worksheet.iter_rows(max_row=1, values_only=True), None) or ()
+            
+            columns = [standardize_column_name(name) if name is not None else None for name in header]
+            if 'RuleID' not in columns:
+                logger.warning(f"⚠️ No RuleID column in sheet '{sheet_name}'")
+                continue
+            
+            position = columns.index('RuleID') + 1
+            for (rule_id,) in worksheet.iter_rows(min_row=2, min_col=position, max_col=position, values_only=True):
+                rule_id = normalize_cell(rule_id)
+                if rule_id is None:
+                    continue
+                # First sheet wins, matching the consolidated RuleID index
+                directory.setdefault(rule_id, sheet_name)
+    finally:
+        workbook.close()
+    
+    logger.info(f"🗂️  Rule directory: {len(directory)} Rule IDs across {len(sheet_names)} sheets")
+    return directory
+
+
+def load_master_sheets(dq_file_path, sheet_names=MASTER_SHEETS, columns=MASTER_COLUMNS, workers=1):
+    parsed = parse_master_sheets(dq_file_path, sheet_names, columns, workers)
+    return build_master_frame(sheet_names, parsed, columns)
+
+
+def parse_master_sheets(dq_file_path, sheet_names=MASTER_SHEETS, columns=MASTER_COLUMNS, workers=1):
+    workers = min(workers, len(sheet_names))
+    
+    if workers > 1:
+        # Sheet XML parsing is CPU-bound; each worker opens the workbook and parses one sheet
+        logger.info(f"🧮 Parsing {len(sheet_names)} sheets on {workers} processes")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                _parse_master_sheet_buffered,
+                [dq_file_path] * len(sheet_names),
+                sheet_names,
+                [columns] * len(sheet_names)
+            ))
+        parsed = []
+        for records, sheet_columns in results:
+            flush_buffered_logs(records)
+            parsed.append(sheet_columns)
+    else:
+        workbook = load_workbook(dq_file_path, read_only=True, data_only=True)
+        try:
+            parsed = [
+                encode_sheet_columns(read_sheet_columns(workbook, sheet_name, columns))
+                for sheet_name in sheet_names
+            ]
+        finally:
+            workbook.close()
+    
+    for sheet_name, sheet_columns in zip(sheet_names, parsed):
+        logger.info(f"  ✓ {sheet_name}: {sheet_columns['__rows__']} rules")
+    
+    return parsed
+
+
+def parse_master_sheet(dq_file_path, sheet_name, columns=MASTER_COLUMNS):
+    # Process-pool entry point: column mapping and encoding happen here, not in the parent
+    workbook = load_workbook(dq_file_path, read_only=True, data_only=True)
+    try:
+        return encode_sheet_columns(read_sheet_columns(workbook, sheet_name, columns))
+    finally:
+        workbook.close()
+
+
+def _parse_master_sheet_buffered(dq_file_path, sheet_name, columns=MASTER_COLUMNS):
+    # Workers have no log file; their records go back to the parent with the result
+    with buffered_logs() as records:
+        sheet_columns = parse_master_sheet(dq_file_path, sheet_name, columns)
+    return records, sheet_columns
+
+
+def encode_sheet_columns(sheet_values):
+    # Low-cardinality columns travel as (codes, categories); the rest as object arrays
+    encoded = {"__rows__": len(next(iter(sheet_values.values()), []))}
+    for column, values in sheet_values.items():
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        if column in CATEGORICAL_COLUMNS:
+            codes, categories = pd.factorize(array)
+            encoded[column] = (codes.astype(np.int32), list(categories))
+        else:
+            encoded[column] = array
+    return encoded
+
+
+def build_master_frame(sheet_names, parsed, columns=MASTER_COLUMNS):
+    # Concatenate per-sheet arrays once and build the consolidated frame directly
+    data = {}
+    for column in columns:
+        parts = [sheet_columns[column] for sheet_columns in parsed]
+        if column in CATEGORICAL_COLUMNS:
+            data[column] = union_categoricals(
+                [pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+                 for codes, categories in parts],
+                ignore_order=True
+            )
+        else:
+            values = np.concatenate(parts) if parts else np.empty(0, dtype=object)
+            # read_excel gives an all-blank column as float NaN, not object None
+            if all(value is None for value in values):
+                values = np.full(len(values), np.nan)
+            data[column] = values
+    
+    row_counts = [sheet_columns["__rows__"] for sheet_columns in parsed]
+    data['SourceSheet'] = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(sheet_names), dtype=np.int32), row_counts),
+        categories=list(sheet_names)
+    )
+    
+    master = pd.DataFrame(data)
+    # Let pandas infer value dtypes (strings, dates, numbers) as it did for list input
+    return master.infer_objects()
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+import pandas as pd
+from .master_loader import (
+    MASTER_SHEETS,
+    MASTER_COLUMNS,
+    load_master_sheets,
+    parse_master_sheets,
+    encode_sheet_columns,
+    frame_sheet_values,
+    build_master_frame
+)
+from .master_cache import peek_cached_master, store_cached_master
+from .enrichment import enrich_master
+from .logger import setup_logger
+
+logger = setup_logger("master_refresh")
+
+CHANGES_SUFFIX = ".changes.json"
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_CELL = f"{{{_MAIN_NS}}}c"
+
+
+def sheet_fingerprints(dq_file_path, sheet_names=MASTER_SHEETS):
+    # Content hash per sheet with shared strings and number formats resolved, so
+    # renumbering either of them on resave does not mark untouched sheets as changed
+    try:
+        with zipfile.ZipFile(dq_file_path) as archive:
+            names = set(archive.namelist())
+            workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+            rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+            shared_strings = _read_shared_strings(archive, names)
+            cell_formats = _read_cell_formats(archive, names)
+
+            targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+            fingerprints = {}
+            for sheet in workbook.iter(f"{{{_MAIN_NS}}}sheet"):
+                target = targets.get(sheet.get(f"{{{_REL_NS}}}id"))
+                if sheet.get("name") not in sheet_names or not target:
+                    continue
+                part = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+                if part in names:
+                    fingerprints[sheet.get("name")] = _hash_sheet(archive, part, shared_strings, cell_formats)
+    except (OSError, KeyError, IndexError, ValueError, zipfile.BadZipFile, ET.ParseError) as e:
+        logger.warning(f"⚠️ Could not fingerprint sheets of {dq_file_path}: {e}")
+        return {}
+
+    return fingerprints
+
+
+def _read_shared_strings(archive, names):
+    if "xl/sharedStrings.xml" not in names:
+        return []
+    root = ET.fromstring(archive.read("xl/sharedStrings.xml"))
+    # Rich-text entries split their text over several runs
+    return ["".join(text.text or "" for text in item.iter(f"{{{_MAIN_NS}}}t")) for item in root.iter(f"{{{_MAIN_NS}}}si")]
+
+
+def _read_cell_formats(archive, names):
+    # Style index -> number format; it decides whether a number is read as a date
+    if "xl/styles.xml" not in names:
+        return []
+    root = ET.fromstring(archive.read("xl/styles.xml"))
+    custom = {fmt.get("numFmtId"): fmt.get("formatCode") for fmt in root.iter(f"{{{_MAIN_NS}}}numFmt")}
+    cell_xfs = root.find(f"{{{_MAIN_NS}}}cellXfs")
+    if cell_xfs is None:
+        return []
+    return [
+        custom.get(xf.get("numFmtId", "0"), xf.get("numFmtId", "0"))
+        for xf in cell_xfs.findall(f"{{{_MAIN_NS}}}xf")
+    ]
+
+
+def _hash_sheet(archive, part, shared_strings, cell_formats):
+    digest = hashlib.sha1()
+    with archive.open(part) as f:
+        for _, cell in ET.iterparse(f):
+            if cell.tag != _CELL:
+                continue
+            value = cell.find(f"{{{_MAIN_NS}}}v")
+            value = value.text if value is not None else None
+            cell_type = cell.get("t", "n")
+            if cell_type == "s" and value is not None:
+                value = shared_strings[int(value)]
+            elif cell_type == "inlineStr":
+                value = "".join(text.text or "" for text in cell.iter(f"{{{_MAIN_NS}}}t"))
+            style = int(cell.get("s", "0"))
+            number_format = cell_formats[style] if style < len(cell_formats) else None
+            digest.update(repr((cell.get("r"), cell_type, value, number_format)).encode("utf-8"))
+            cell.clear()
+    return digest.hexdigest()
+
+
+def capture_master_state(dq_file_path):
+    # Call before the workbook is overwritten; None when there is nothing to diff against
+    if not os.path.exists(dq_file_path):
+        return None
+
+    master = peek_cached_master(dq_file_path)
+    if master is None:
+        return None
+
+    return {"master": master, "fingerprints": sheet_fingerprints(dq_file_path)}
+
+
+def refresh_master(dq_file_path, previous, sheet_names=MASTER_SHEETS, columns=MASTER_COLUMNS, workers=1):
+    old_master = previous["master"]
+    old_fingerprints = previous["fingerprints"]
+    new_fingerprints = sheet_fingerprints(dq_file_path, sheet_names)
+
+    reused = [
+        sheet_name for sheet_name in sheet_names
+        if new_fingerprints.get(sheet_name) is not None
+        and new_fingerprints.get(sheet_name) == old_fingerprints.get(sheet_name)
+    ]
+    reparsed = [sheet_name for sheet_name in sheet_names if sheet_name not in reused]
+    logger.info(f"♻️  Re-upload: reusing {len(reused)} unchanged sheet(s), parsing {len(reparsed)}")
+
+    if not reused:
+        master = load_master_sheets(dq_file_path, sheet_names, columns, workers=workers)
+    else:
+        parsed = dict(zip(reparsed, parse_master_sheets(dq_file_path, reparsed, columns, workers=workers)))
+        for sheet_name in reused:
+            parsed[sheet_name] = encode_sheet_columns(
+                frame_sheet_values(old_master[old_master["SourceSheet"] == sheet_name], columns)
+            )
+        # Rebuilt from per-sheet parts so the frame is identical to a full parse
+        master = build_master_frame(sheet_names, [parsed[sheet_name] for sheet_name in sheet_names], columns)
+
+    enrich_master(master)
+
+    summary = diff_masters(old_master, master, columns)
+    summary["reparsed_sheets"] = reparsed
+    summary["reused_sheets"] = reused
+    _report_changes(dq_file_path, summary)
+
+    store_cached_master(dq_file_path, master, build_directory_from_master(master))
+    return master
+
+
+def row_hashes(master, columns=MASTER_COLUMNS):
+    # RuleID -> content hash of its first row, matching the RuleID index
+    keyed = master[master["RuleID"].notna()].drop_duplicates("RuleID")
+    hashes = pd.util.hash_pandas_object(keyed[["SourceSheet"] + columns].astype(object), index=False)
+    return dict(zip(keyed["RuleID"].tolist(), hashes.tolist()))
+
+
+def diff_masters(old_master, new_master, columns=MASTER_COLUMNS):
+    old_hashes = row_hashes(old_master, columns)
+    new_hashes = row_hashes(new_master, columns)
+
+    return {
+        "added": [rule_id for rule_id in new_hashes if rule_id not in old_hashes],
+        "removed": [rule_id for rule_id in old_hashes if rule_id not in new_hashes],
+        "changed": [
+            rule_id for rule_id, row_hash in new_hashes.items()
+            if rule_id in old_hashes and old_hashes[rule_id] != row_hash
+        ]
+    }
+
+
+def build_directory_from_master(master):
+    directory = {}
+    for rule_id, sheet_name in zip(master["RuleID"].tolist(), master["SourceSheet"].tolist()):
+        if rule_id is not None and not pd.isna(rule_id):
+            directory.setdefault(rule_id, sheet_name)
+    return directory
+
+
+def get_changes_path(dq_file_path):
+    base, _ = os.path.splitext(dq_file_path)
+    return f"{base}{CHANGES_SUFFIX}"
+
+
+def _report_changes(dq_file_path, summary):
+    for kind, icon in (("added", "➕"), ("changed", "✏️ "), ("removed", "➖")):
+        rule_ids = summary[kind]
+        if rule_ids:
+            logger.info(f"{icon} {len(rule_ids)} rule(s) {kind}: {', '.join(str(rule_id) for rule_id in rule_ids)}")
+
+    if not (summary["added"] or summary["changed"] or summary["removed"]):
+        logger.info("✅ No rule changes in the re-uploaded master")
+
+    changes_path = get_changes_path(dq_file_path)
+    try:
+        with open(changes_path, "w", encoding="utf-8") as f:
+            json.dump({"uploaded_at": datetime.now().isoformat(timespec="seconds"), **summary}, f, indent=2, default=str)
+        logger.info(f"📝 Changed-rules summary written to {changes_path}")
+    except OSError as e:
+        logger.warning(f"⚠️ Could not write changed-rules summary {changes_path}: {e}")
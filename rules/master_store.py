@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+import pandas as pd
+from .master_cache import compute_file_hash, get_store_path
+from .logger import setup_logger
+
+logger = setup_logger("master_store")
+
+MASTER_TABLE = "master"
+COLUMNS_TABLE = "master_columns"
+INDEXED_COLUMNS = ["RuleID", "SourceSheet", "Entity"]
+
+# store path -> MasterStore; the objects only hold a path, connections are per call
+_STORES = {}
+_STORE_LOCK = threading.Lock()
+
+
+class MasterStore:
+    """Consolidated DQ master materialized into a local SQLite file.
+
+    Rows keep their consolidated order in ``row_position`` so lookups return the
+    first occurrence of a RuleID, like the in-memory RuleID index. The file is
+    read-only once written, so any number of threads or worker processes can
+    query it at the same time.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._dtypes = None
+
+    def connect(self):
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def get_rule(self, rule_id):
+        rules = self.fetch_rules([rule_id])
+        return rules.iloc[0] if not rules.empty else None
+
+    def fetch_rules(self, rule_ids):
+        # First occurrence per requested RuleID, in consolidated master order
+        rule_ids = list(dict.fromkeys(rule_id for rule_id in rule_ids if rule_id is not None))
+        if not rule_ids:
+            return self._restore(pd.DataFrame(columns=list(self.dtypes)))
+
+        placeholders = ", ".join("?" for _ in rule_ids)
+        query = f"""
+            SELECT * FROM "{MASTER_TABLE}"
+            WHERE row_position IN (
+                SELECT MIN(row_position) FROM "{MASTER_TABLE}"
+                WHERE "RuleID" IN ({placeholders})
+                GROUP BY "RuleID"
+            )
+            ORDER BY row_position
+        """
+        with closing(self.connect()) as conn:
+            rules = pd.read_sql(query, conn, params=rule_ids)
+        return self._restore(rules.drop(columns="row_position"))
+
+    def query(self, where, params=()):
+        # Ad-hoc search/reporting, e.g. store.query('"Entity" = ?', ["Practitioner"])
+        query = f'SELECT * FROM "{MASTER_TABLE}" WHERE {where} ORDER BY row_position'
+        with closing(self.connect()) as conn:
+            rows = pd.read_sql(query, conn, params=list(params))
+        return self._restore(rows.drop(columns="row_position"))
+
+    @property
+    def dtypes(self):
+        if self._dtypes is None:
+            with closing(self.connect()) as conn:
+                self._dtypes = dict(conn.execute(f'SELECT name, dtype FROM "{COLUMNS_TABLE}" ORDER BY position'))
+        return self._dtypes
+
+    def _restore(self, frame):
+        # SQLite has no datetime/categorical types; put the master's dtypes back
+        for column, dtype in self.dtypes.items():
+            if column not in frame.columns:
+                continue
+            if dtype.startswith("datetime64"):
+                frame[column] = pd.to_datetime(frame[column])
+            else:
+                frame[column] = frame[column].astype(dtype)
+        return frame[[column for column in self.dtypes if column in frame.columns]]
+
+
+def materialize_master(dq_rules_master, db_path):
+    dtypes = {column: str(dtype) for column, dtype in dq_rules_master.dtypes.items()}
+
+    frame = dq_rules_master.reset_index(drop=True)
+    frame.insert(0, "row_position", range(len(frame)))
+    # Untyped (BLOB affinity) object columns keep int and text values apart, e.g. numeric RuleIDs
+    column_types = {column: "BLOB" for column, dtype in dtypes.items() if dtype == "object"}
+
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        frame.to_sql(MASTER_TABLE, conn, index=False, dtype=column_types)
+        pd.DataFrame(
+            {"position": range(len(dtypes)), "name": list(dtypes), "dtype": list(dtypes.values())}
+        ).to_sql(COLUMNS_TABLE, conn, index=False)
+        for column in INDEXED_COLUMNS:
+            if column in frame.columns:
+                conn.execute(f'CREATE INDEX "ix_{MASTER_TABLE}_{column}" ON "{MASTER_TABLE}" ("{column}", row_position)')
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Readers never see a half-written store
+    os.replace(tmp_path, db_path)
+    logger.info(f"💾 Materialized {len(frame)} master rows into {db_path}")
+    return MasterStore(db_path)
+
+
+def is_master_stored(file_path):
+    return os.path.exists(get_store_path(file_path, compute_file_hash(file_path)))
+
+
+def open_master_store(file_path, builder):
+    # Store for the workbook's current content; builder(file_path) returns the full master
+    db_path = get_store_path(file_path, compute_file_hash(file_path))
+
+    with _STORE_LOCK:
+        store = _STORES.get(db_path)
+        if store is not None and os.path.exists(db_path):
+            return store
+
+        if os.path.exists(db_path):
+            logger.info(f"⚡ Using master store: {db_path}")
+            store = MasterStore(db_path)
+        else:
+            store = materialize_master(builder(file_path), db_path)
+
+        _STORES.clear()
+        _STORES[db_path] = store
+        return store
@@ -0,0 +1,80 @@
+import threading
+import time
+from sqlalchemy import text
+import pandas as pd
+from config import METADATA_CACHE_TTL_SECONDS
+from .session import use_connection, check_schema
+from .logger import setup_logger
+
+logger = setup_logger("metadata")
+
+METADATA_SCHEMA = "healthfirst_configdb"
+
+# (UPPER(metadata_set), UPPER(metadata_value)) -> metadata_id, shared by every request
+_METADATA_CACHE = {"map": None, "loaded_at": 0.0, "engine_url": None}
+_METADATA_LOCK = threading.Lock()
+
+
+def load_metadata_map(engine, schema=METADATA_SCHEMA):
+    query = text(f"""
+        SELECT metadata_set, metadata_value, metadata_id
+        FROM {check_schema(schema)}.validation_rule_metadata
+    """)
+    
+    with use_connection(engine) as conn:
+        result = pd.read_sql(query, conn)
+    
+    metadata_map = {}
+    for metadata_set, metadata_value, metadata_id in result.itertuples(index=False):
+        if pd.isna(metadata_set) or pd.isna(metadata_value) or pd.isna(metadata_id):
+            continue
+        # First row wins, matching the old single-row lookup
+        key = (str(metadata_set).upper(), str(metadata_value).upper())
+        metadata_map.setdefault(key, int(metadata_id))
+    
+    return metadata_map
+
+
+def get_metadata_map(engine, ttl_seconds=METADATA_CACHE_TTL_SECONDS):
+    engine_url = str(engine.engine.url)
+    
+    with _METADATA_LOCK:
+        cache_age = time.monotonic() - _METADATA_CACHE["loaded_at"]
+        if (
+            _METADATA_CACHE["map"] is not None
+            and _METADATA_CACHE["engine_url"] == engine_url
+            and cache_age < ttl_seconds
+        ):
+            return _METADATA_CACHE["map"]
+        
+        return _load_into_cache(engine, engine_url)
+
+
+def refresh_metadata_cache(engine):
+    with _METADATA_LOCK:
+        return _load_into_cache(engine, str(engine.engine.url))
+
+
+def clear_metadata_cache():
+    with _METADATA_LOCK:
+        _METADATA_CACHE.update({"map": None, "loaded_at": 0.0, "engine_url": None})
+
+
+def lookup_metadata_id(metadata_type, metadata_value, engine):
+    metadata_map = get_metadata_map(engine)
+    metadata_id = metadata_map.get((str(metadata_type).upper(), str(metadata_value).upper()))
+    
+    if metadata_id is None:
+        logger.warning(f"⚠️ Metadata not found: {metadata_type} = {metadata_value}")
+    return metadata_id
+
+
+def _load_into_cache(engine, engine_url):
+    metadata_map = load_metadata_map(engine)
+    _METADATA_CACHE.update({
+        "map": metadata_map,
+        "loaded_at": time.monotonic(),
+        "engine_url": engine_url
+    })
+    logger.info(f"📚 Loaded {len(metadata_map)} validation_rule_metadata entries into cache")
+    return metadata_map
@@ -0,0 +1,192 @@
+import threading
+import time
+from sqlalchemy import text
+import pandas as pd
+from config import REFERENCE_CACHE_TTL_SECONDS
+from .session import use_connection, configdb_schema
+from .fanout import union_lookup, split_by_tenant
+from .async_db import run_lookups
+from .logger import setup_logger
+
+logger = setup_logger("reference")
+
+
+ZONE_TABLES_SQL = """
+    SELECT table_name, process_zone, table_id
+    FROM {schema}.des_zone_table_list
+"""
+ENTITIES_SQL = """
+    SELECT entity_name, pdm_entity_id, entity_key_field_name
+    FROM {schema}.pdm_entity_master
+"""
+SOURCE_TABLES_SQL = """
+    SELECT DISTINCT source_owner_name, source_table_id
+    FROM {schema}.des_validation_rules_extn
+    WHERE source_owner_name IS NOT NULL
+"""
+REFERENCE_QUERIES = {
+    "zone_tables": ZONE_TABLES_SQL,
+    "entities": ENTITIES_SQL,
+    "source_tables": SOURCE_TABLES_SQL
+}
+
+
+class TenantReferenceSnapshot:
+    """In-memory copy of the small {tenant}_configdb reference tables used by configure."""
+    
+    def __init__(self, tenant, ttl_seconds=REFERENCE_CACHE_TTL_SECONDS):
+        self.tenant = tenant
+        self.ttl_seconds = ttl_seconds
+        self.loaded_at = None
+        self.table_ids = {}
+        self.entities = {}
+        self.source_tables = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self._lock = threading.Lock()
+    
+    def is_expired(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl_seconds
+    
+    def ensure_loaded(self, engine):
+        with self._lock:
+            if self.is_expired():
+                self._load(engine)
+    
+    def refresh(self, engine):
+        with self._lock:
+            self._load(engine)
+    
+    def get_table_id(self, engine, table_name, zone):
+        self.ensure_loaded(engine)
+        return self._lookup(self.table_ids, (str(table_name).upper(), zone))
+    
+    def get_entity_info(self, engine, entity_type):
+        self.ensure_loaded(engine)
+        return self._lookup(self.entities, str(entity_type).upper())
+    
+    def get_source_table_id(self, engine, source_owner):
+        self.ensure_loaded(engine)
+        return self._lookup(self.source_tables, str(source_owner).upper())
+    
+    def stats(self):
+        return {
+            "tenant": self.tenant,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "tables": len(self.table_ids),
+            "entities": len(self.entities),
+            "source_owners": len(self.source_tables)
+        }
+    
+    def _lookup(self, mapping, key):
+        value = mapping.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+    
+    def _load(self, engine):
+        schema = configdb_schema(self.tenant)
+        
+        with use_connection(engine) as conn:
+            zone_tables = pd.read_sql(text(ZONE_TABLES_SQL.format(schema=schema)), conn)
+            entities = pd.read_sql(text(ENTITIES_SQL.format(schema=schema)), conn)
+            source_tables = pd.read_sql(text(SOURCE_TABLES_SQL.format(schema=schema)), conn)
+        
+        self._apply(zone_tables, entities, source_tables)
+    
+    def _apply(self, zone_tables, entities, source_tables):
+        # First row per key wins, matching the old single-row lookups
+        table_ids = {}
+        for table_name, zone, table_id in zone_tables.itertuples(index=False):
+            if pd.notna(table_name) and pd.notna(table_id):
+                table_ids.setdefault((str(table_name).upper(), zone), int(table_id))
+        
+        entity_map = {}
+        for entity_name, entity_id, entity_key in entities.itertuples(index=False):
+            if pd.notna(entity_name) and pd.notna(entity_id):
+                entity_map.setdefault(str(entity_name).upper(), (int(entity_id), entity_key))
+        
+        # Values are rendered one by one: a NULL elsewhere in the table makes the column float (77 -> 77.0)
+        source_ids = {}
+        for owner, table_id in source_tables.itertuples(index=False):
+            if pd.notna(owner) and pd.notna(table_id):
+                source_ids.setdefault(owner, []).append(_id_text(table_id))
+        source_map = {owner: ','.join(table_ids) for owner, table_ids in source_ids.items()}
+        
+        self.table_ids = table_ids
+        self.entities = entity_map
+        self.source_tables = source_map
+        self.loaded_at = time.monotonic()
+        self.loads += 1
+        
+        logger.info(
+            f"📚 Loaded reference snapshot for {self.tenant}: {len(table_ids)} tables, "
+            f"{len(entity_map)} entities, {len(source_map)} source owners"
+        )
+
+
+def _id_text(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+# tenant -> TenantReferenceSnapshot, shared by every request in this process
+_SNAPSHOTS = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+def get_tenant_reference(tenant):
+    with _SNAPSHOTS_LOCK:
+        snapshot = _SNAPSHOTS.get(tenant)
+        if snapshot is None:
+            snapshot = TenantReferenceSnapshot(tenant)
+            _SNAPSHOTS[tenant] = snapshot
+        return snapshot
+
+
+def refresh_tenant_reference(engine, tenant=None):
+    tenants = [tenant] if tenant else list(_SNAPSHOTS)
+    for name in tenants:
+        get_tenant_reference(name).refresh(engine)
+
+
+def load_tenant_references(engine, tenants, lookups=None):
+    """Load every expired snapshot with one UNION ALL query per reference table.
+
+    ``lookups`` ({name: Lookup}) are other independent queries the caller needs;
+    they are run in the same batch as the reference queries and their frames returned.
+    """
+    lookups = dict(lookups or {})
+    snapshots = [get_tenant_reference(tenant) for tenant in dict.fromkeys(tenants)]
+    expired = [snapshot for snapshot in snapshots if snapshot.is_expired()]
+    names = [snapshot.tenant for snapshot in expired]
+    
+    if expired:
+        lookups.update({
+            f"reference:{table}": union_lookup(names, sql) for table, sql in REFERENCE_QUERIES.items()
+        })
+    results = run_lookups(engine, lookups)
+    
+    if expired:
+        frames = {table: split_by_tenant(results.pop(f"reference:{table}"), names) for table in REFERENCE_QUERIES}
+        for snapshot in expired:
+            with snapshot._lock:
+                snapshot._apply(
+                    frames["zone_tables"][snapshot.tenant],
+                    frames["entities"][snapshot.tenant],
+                    frames["source_tables"][snapshot.tenant]
+                )
+    
+    return results
+
+
+def get_reference_cache_stats():
+    with _SNAPSHOTS_LOCK:
+        return [snapshot.stats() for snapshot in _SNAPSHOTS.values()]
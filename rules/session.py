@@ -0,0 +1,82 @@
+import re
+from contextlib import contextmanager
+from functools import lru_cache
+from sqlalchemy import text, bindparam
+from sqlalchemy.engine import Connection
+from config import DB_WORKFLOW_ISOLATION_LEVEL, TENANT_DEV_FILE_PATHS
+from .backend import configdb_schemas
+from .logger import setup_logger
+
+logger = setup_logger("session")
+
+# Schema names cannot be bound parameters, so only configured tenants' schemas reach SQL text
+ALLOWED_SCHEMAS = frozenset(configdb_schemas(TENANT_DEV_FILE_PATHS))
+
+
+def check_schema(schema):
+    if schema not in ALLOWED_SCHEMAS:
+        raise ValueError(f"Unknown configdb schema: {schema!r}")
+    return schema
+
+
+def configdb_schema(tenant):
+    return check_schema(f"{tenant}_configdb")
+
+
+@lru_cache(maxsize=256)
+def compile_query(sql, expanding=()):
+    # text() parses the SQL for :params on every call; lookups reuse the same few statements
+    query = text(sql)
+    if expanding:
+        query = query.bindparams(*(bindparam(name, expanding=True) for name in expanding))
+    return query
+
+
+# Same pattern SQLAlchemy's text() uses to find :name parameters
+_BIND_PARAM = re.compile(r"(?<![:\w\x5c]):(\w+)(?!:)")
+
+
+def positional_sql(sql, expanding=()):
+    """(sql, names) with :name parameters turned into Postgres' $1, $2 ... placeholders.
+
+    Expanding list parameters (``IN :name``) become ``= ANY($n)`` and take the
+    whole list as one array argument.
+    """
+    for name in expanding:
+        sql = re.sub(rf"\bIN\s+:{name}\b", f"= ANY(:{name})", sql, flags=re.IGNORECASE)
+    names = list(dict.fromkeys(_BIND_PARAM.findall(sql)))
+    return _BIND_PARAM.sub(lambda match: f"${names.index(match.group(1)) + 1}", sql), names
+
+
+@contextmanager
+def use_connection(bind):
+    # Helpers accept either the Engine or a workflow session connection.
+    # A session connection is reused as-is and left open for the caller.
+    if isinstance(bind, Connection):
+        yield bind
+    else:
+        with bind.connect() as conn:
+            yield conn
+
+
+@contextmanager
+def workflow_session(engine, isolation_level=DB_WORKFLOW_ISOLATION_LEVEL):
+    options = {}
+    if engine.dialect.name == "postgresql":
+        # One consistent snapshot for every lookup and max-ID read in the workflow
+        options = {"isolation_level": isolation_level, "postgresql_readonly": True}
+    
+    conn = engine.connect()
+    try:
+        if options:
+            conn = conn.execution_options(**options)
+        trans = conn.begin()
+        logger.debug(f"🔌 Opened workflow session ({isolation_level if options else 'default isolation'})")
+        try:
+            yield conn
+        finally:
+            # The workflow only reads; nothing to commit
+            trans.rollback()
+    finally:
+        conn.close()
+        logger.debug("🔌 Closed workflow session")
@@ -0,0 +1,183 @@
+import functools
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from config import TRACING_ENABLED, TIMINGS_DIR
+from .logger import setup_logger
+
+logger = setup_logger("tracing")
+
+# The span work in this thread is currently nested under; None means tracing is off for it
+_STATE = threading.local()
+
+
+class Span:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.children = []
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def to_dict(self):
+        data = {"name": self.name, "seconds": round(self.duration or 0.0, 6)}
+        if self.attributes:
+            data["attributes"] = {key: str(value) for key, value in self.attributes.items()}
+        if self.children:
+            data["children"] = [child.to_dict() for child in self.children]
+        return data
+
+
+class _SpanContext:
+    def __init__(self, parent, name, attributes):
+        self.parent = parent
+        self.span = Span(name, attributes)
+
+    def __enter__(self):
+        # list.append is atomic, so spans from worker threads can share a parent
+        self.parent.children.append(self.span)
+        _STATE.span = self.span
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.finish()
+        _STATE.span = self.parent
+        return False
+
+
+class _NoopContext:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopContext()
+
+
+def span(name, **attributes):
+    """Time a block as a child of the current span; a shared no-op when nothing is being traced."""
+    parent = getattr(_STATE, "span", None)
+    if parent is None:
+        return _NOOP
+    return _SpanContext(parent, name, attributes)
+
+
+def traced(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_STATE, "span", None) is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    return getattr(_STATE, "span", None)
+
+
+class attach:
+    """Nest a worker thread's spans under a span captured with current_span() in the submitting thread."""
+
+    def __init__(self, parent):
+        self.parent = parent
+
+    def __enter__(self):
+        self.previous = getattr(_STATE, "span", None)
+        _STATE.span = self.parent
+
+    def __exit__(self, exc_type, exc, tb):
+        _STATE.span = self.previous
+        return False
+
+
+class trace_run:
+    """Root span for one workflow run when TRACING_ENABLED; a no-op otherwise.
+
+    Call ``finish(generated_files, ticket)`` once the run has produced its files to
+    log the timing summary and write it as JSON under ``TIMINGS_DIR``.
+    """
+
+    def __init__(self, name, **attributes):
+        self.root = Span(name, attributes) if TRACING_ENABLED else None
+
+    def __enter__(self):
+        if self.root is not None:
+            self.previous = getattr(_STATE, "span", None)
+            self.root.started = time.perf_counter()
+            _STATE.span = self.root
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.root is not None:
+            self.root.finish()
+            _STATE.span = self.previous
+        return False
+
+    def finish(self, generated_files, ticket=None):
+        if self.root is None:
+            return None
+        self.root.finish()
+        log_timing_summary(self.root)
+        return write_timing_file(self.root, generated_files, ticket)
+
+
+def summarize(root):
+    # span name -> count, total and slowest seconds, in first-seen order
+    totals = {}
+    pending = list(root.children)
+    while pending:
+        current = pending.pop(0)
+        entry = totals.setdefault(current.name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += current.duration or 0.0
+        entry["max_seconds"] = max(entry["max_seconds"], current.duration or 0.0)
+        pending.extend(current.children)
+    return totals
+
+
+def log_timing_summary(root):
+    logger.info("")
+    logger.info(f"⏱️  Timing for {root.name}: {root.duration:.3f}s")
+    for name, entry in summarize(root).items():
+        share = entry["seconds"] / root.duration * 100 if root.duration else 0.0
+        logger.info(
+            f"   {name:<28s} {entry['seconds']:8.3f}s {share:5.1f}%  "
+            f"x{entry['count']:<5d} max {entry['max_seconds']:.3f}s"
+        )
+
+
+def get_timing_path(workflow, ticket=None, started=None):
+    # Kept apart from the changelog data folders, e.g. logs/timings/add_update_DQ-123_20240101T120000123456.timing.json
+    stamp = (started or datetime.now()).strftime("%Y%m%dT%H%M%S%f")
+    parts = [workflow] + ([str(ticket)] if ticket is not None else []) + [stamp]
+    name = re.sub(r"[^\w.-]+", "_", "_".join(parts))
+    return os.path.join(TIMINGS_DIR, f"{name}.timing.json")
+
+
+def write_timing_file(root, generated_files, ticket=None):
+    timing_path = get_timing_path(root.name, ticket)
+    summary = {
+        name: {**entry, "seconds": round(entry["seconds"], 6), "max_seconds": round(entry["max_seconds"], 6)}
+        for name, entry in summarize(root).items()
+    }
+    try:
+        os.makedirs(TIMINGS_DIR, exist_ok=True)
+        with open(timing_path, "w", encoding="utf-8") as f:
+            json.dump({"files": list(generated_files), "summary": summary, "trace": root.to_dict()}, f, indent=2)
+    except OSError as e:
+        logger.warning(f"⚠️ Could not write timing file {timing_path}: {e}")
+        return None
+
+    logger.info(f"⏱️  Timing written to {timing_path}")
+    return timing_path
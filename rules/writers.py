@@ -1,6 +1,8 @@
 import os, csv, re
 from datetime import datetime
+from .tracing import traced
 
+@traced("write_csv")
 def write_csv(df, path, version):
     try:
         # Validate path components
@@ -22,6 +24,7 @@ def write_csv(df, path, version):
     except OSError as e:
         raise OSError(f"Failed to write CSV file. Path: '{path}', Version: '{version}'. Error: {str(e)}") from e
 
+@traced("write_csv_extn")
 def write_csv_extn(df, path, version):
     try:
         os.makedirs(path, exist_ok=True)
@@ -33,6 +36,7 @@ def write_csv_extn(df, path, version):
     except OSError as e:
         raise OSError(f"Failed to write CSV extension file. Path: '{path}', Version: '{version}'. Error: {str(e)}") from e
 
+@traced("write_xml")
 def write_xml(path, version, ticket_number):
     try:
         os.makedirs(path, exist_ok=True)
@@ -89,6 +93,7 @@ def write_xml(path, version, ticket_number):
     except OSError as e:
         raise OSError(f"Failed to write XML file. Path: '{path}', Version: '{version}'. Error: {str(e)}") from e
 
+@traced("write_xml_extn")
 def write_xml_extn(path, version, ticket_number):
     try:
         os.makedirs(path, exist_ok=True)
@@ -136,6 +141,7 @@ def write_xml_extn(path, version, ticket_number):
     except OSError as e:
         raise OSError(f"Failed to write XML extension file. Path: '{path}', Version: '{version}'. Error: {str(e)}") from e
 
+@traced("update_dev_file")
 def update_dev_file(path, version, ticket_number):
     try:
         # Validate that the path exists or can be created
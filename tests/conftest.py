@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rules import logger as logger_module
+from rules.backend import create_sqlite_engine, configdb_schemas
+from rules.helper import VALIDATION_RULE_COLUMNS, RULE_EXTN_COLUMNS
+
+TENANTS = ["healthfirst", "pehp"]
+
+# Column types as in the configdb; everything not listed is text
+INTEGER_COLUMNS = {
+    "rule_id", "rule_category_id", "rule_type_id", "entity_type_id", "range_type_id",
+    "sub_entity_type_id", "ingest_or_ui_id", "enforcement_level_id", "error_warning_type_id",
+    "rule_extn_id", "task_id", "hrpdm_table_id", "source_table_id", "implmnt_order", "reference_codeset_id",
+    "pdm_entity_id"
+}
+
+
+def _columns(columns):
+    return ", ".join(f"{column} {'INTEGER' if column in INTEGER_COLUMNS else 'TEXT'}" for column in columns)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def log_file(tmp_path_factory):
+    # Keep test runs out of the tracked logs/automation.log. Importing rules opens nothing;
+    # the shared handler opens its file on the first record, which is now this one.
+    path = str(tmp_path_factory.mktemp("logs") / "automation.log")
+    handler = logger_module._get_file_handler()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(logger_module, "LOG_FILE", path)
+        patch.setattr(handler, "baseFilename", path)
+        patch.setattr(handler, "stream", None)
+        yield path
+        handler.acquire()
+        try:
+            if handler.stream is not None:
+                handler.stream.close()
+        finally:
+            handler.release()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # The offline SQLite backend with one attached file per {tenant}_configdb schema
+    engine = create_sqlite_engine(str(tmp_path), configdb_schemas(TENANTS))
+    with engine.begin() as conn:
+        for schema in configdb_schemas(TENANTS):
+            conn.execute(text(f"CREATE TABLE {schema}.validation_rules ({_columns(VALIDATION_RULE_COLUMNS)})"))
+            conn.execute(text(f"CREATE TABLE {schema}.des_validation_rules_extn ({_columns(RULE_EXTN_COLUMNS)})"))
+            conn.execute(text(
+                f"CREATE TABLE {schema}.des_zone_table_list (table_id INTEGER, table_name TEXT, process_zone TEXT)"
+            ))
+            conn.execute(text(
+                f"CREATE TABLE {schema}.pdm_entity_master "
+                "(pdm_entity_id INTEGER, entity_name TEXT, entity_key_field_name TEXT)"
+            ))
+    yield engine
+    engine.dispose()
+
+
+def insert_rows(engine, table, rows):
+    with engine.begin() as conn:
+        for row in rows:
+            columns = ", ".join(row)
+            values = ", ".join(f":{column}" for column in row)
+            conn.execute(text(f"INSERT INTO {table} ({columns}) VALUES ({values})"), row)
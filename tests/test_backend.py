@@ -0,0 +1,22 @@
+import sqlite3
+from contextlib import closing
+from conftest import insert_rows
+from rules.backend import export_snapshot, get_snapshot_path
+
+
+def test_snapshot_keeps_nullable_integer_columns_integer(engine, tmp_path):
+    insert_rows(engine, "healthfirst_configdb.des_zone_table_list", [
+        {"table_id": 77, "table_name": "claims", "process_zone": "RAW"},
+        {"table_id": None, "table_name": "members", "process_zone": "RAW"},
+    ])
+
+    snapshot_dir = str(tmp_path / "snapshot")
+    export_snapshot(engine, snapshot_dir, ["healthfirst_configdb"], tables=["des_zone_table_list"])
+
+    with closing(sqlite3.connect(get_snapshot_path(snapshot_dir, "healthfirst_configdb"))) as snapshot:
+        columns = {row[1]: row[2] for row in snapshot.execute("PRAGMA table_info(des_zone_table_list)")}
+        values = snapshot.execute("SELECT table_id, typeof(table_id) FROM des_zone_table_list ORDER BY table_name").fetchall()
+
+    assert columns["table_id"] == "INTEGER"
+    assert columns["table_name"] == "TEXT"
+    assert values == [(77, "integer"), (None, "null")]
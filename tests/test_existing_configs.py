@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from conftest import insert_rows
+from rules.configure import prefetch_configure_lookups, _drop_duplicates
+from rules.helper import RULE_EXTN_COLUMNS, compare_frames
+
+
+def _extn(rule_extn_id, rule_id, hrpdm_table_id):
+    row = {column: None for column in RULE_EXTN_COLUMNS}
+    row.update({
+        "rule_extn_id": rule_extn_id,
+        "rule_id": rule_id,
+        "rule_applied_zone": "CURATED",
+        "hrpdm_table_id": hrpdm_table_id,
+        "active_flag": "Y",
+        "pdm_entity_id": 5,
+        "source_owner_name": "ABC",
+    })
+    return row
+
+
+def test_null_in_batch_does_not_make_identical_config_look_changed(engine):
+    insert_rows(engine, "healthfirst_configdb.validation_rules", [
+        {"rule_id": 1, "business_rule_id": "DQ1"},
+        {"rule_id": 2, "business_rule_id": "DQ2"},
+    ])
+    # DQ1's NULL hrpdm_table_id used to turn DQ2's 100 into 100.0
+    insert_rows(engine, "healthfirst_configdb.des_validation_rules_extn", [_extn(11, 1, None), _extn(12, 2, 100)])
+    configs = pd.DataFrame({"tenant": "healthfirst", "ruleid": ["DQ1", "DQ2"]})
+
+    db_rule_ids, existing_extns = prefetch_configure_lookups(engine, configs, ["healthfirst"])["healthfirst"]
+    assert db_rule_ids == {"DQ1": 1, "DQ2": 2}
+
+    existing_row = existing_extns[(2, "ABC")]
+    assert _drop_duplicates([_extn(12, 2, 100)], [existing_row]) == []
+
+
+def test_whole_floats_compare_as_integers():
+    existing = pd.DataFrame({"hrpdm_table_id": [np.nan, 100.0], "rule_id": [1, 2]})
+    candidates = pd.DataFrame({"hrpdm_table_id": [None, 100], "rule_id": [1, 2]}, dtype=object)
+
+    comparison = compare_frames(existing, candidates, ["hrpdm_table_id", "rule_id"])
+    assert comparison["is_identical"].tolist() == [True, True]
+
+    comparison = compare_frames(existing, candidates.assign(hrpdm_table_id=[None, 101]), ["hrpdm_table_id"])
+    assert comparison["changed_fields"].tolist() == [[], ["hrpdm_table_id"]]
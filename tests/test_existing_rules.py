@@ -0,0 +1,48 @@
+from conftest import insert_rows
+from rules.add_update import _get_existing_rules
+from rules.helper import VALIDATION_RULE_COLUMNS, RULE_COMPARE_FIELDS, compare_frames, compare_rule_data
+
+import pandas as pd
+
+
+def _rule(business_rule_id, rule_id, ingest_or_ui_id):
+    row = {column: None for column in VALIDATION_RULE_COLUMNS}
+    row.update({
+        "rule_id": rule_id,
+        "business_rule_id": business_rule_id,
+        "rule_name": f"Rule {business_rule_id}",
+        "rule_type_id": 10,
+        "entity_type_id": 20,
+        "ingest_or_ui_id": ingest_or_ui_id,
+        "enabled": "Y",
+    })
+    return row
+
+
+def test_null_in_batch_does_not_make_identical_rule_look_changed(engine):
+    # DQ1 has a NULL ingest_or_ui_id, which used to turn the whole column into floats (18 -> 18.0)
+    insert_rows(engine, "healthfirst_configdb.validation_rules", [_rule("DQ1", 1, None), _rule("DQ2", 2, 18)])
+
+    existing_rules = _get_existing_rules(engine, ["DQ1", "DQ2"])
+    candidate = _rule("DQ2", 2, 18)
+
+    # Row-wise path
+    assert compare_rule_data(existing_rules.loc["DQ2"], candidate)
+
+    # Vectorized path
+    existing = existing_rules.astype(object).loc[["DQ2"]].reset_index(drop=True)
+    comparison = compare_frames(existing, pd.DataFrame([candidate]), RULE_COMPARE_FIELDS)
+    assert bool(comparison.at[0, "is_identical"])
+    assert comparison.at[0, "changed_fields"] == []
+
+
+def test_null_still_differs_from_a_value(engine):
+    insert_rows(engine, "healthfirst_configdb.validation_rules", [_rule("DQ1", 1, None), _rule("DQ2", 2, 18)])
+
+    existing_rules = _get_existing_rules(engine, ["DQ1", "DQ2"])
+    comparison = compare_frames(
+        existing_rules.astype(object).loc[["DQ1"]].reset_index(drop=True),
+        pd.DataFrame([_rule("DQ1", 1, 18)]),
+        RULE_COMPARE_FIELDS
+    )
+    assert comparison.at[0, "changed_fields"] == ["ingest_or_ui_id"]
@@ -0,0 +1,177 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import pandas as pd
+import pytest
+from conftest import TENANTS, insert_rows
+from rules import id_allocator
+from rules.backend import create_sqlite_engine, configdb_schemas
+from rules.id_allocator import allocate_rule_ids, allocate_rule_extn_ids, id_reservations
+
+
+@pytest.fixture
+def data_folder(tmp_path, monkeypatch):
+    data_folder = tmp_path / "common"
+    data_folder.mkdir()
+    monkeypatch.setattr(id_allocator, "ID_LEDGER_PATH", str(tmp_path / "id_ledger.json"))
+    monkeypatch.setitem(id_allocator.TENANT_DATA_FOLDER_PATHS, "common", str(data_folder))
+    monkeypatch.setitem(id_allocator.TENANT_DATA_FOLDER_PATHS, "healthfirst", str(tmp_path / "healthfirst"))
+    return data_folder
+
+
+def _write_changelog(folder, name, rule_ids):
+    pd.DataFrame({"rule_id": rule_ids, "business_rule_id": [f"DQ{i}" for i in rule_ids]}).to_csv(folder / name, index=False)
+
+
+def test_concurrent_reservations_get_disjoint_blocks(engine, data_folder):
+    insert_rows(engine, "healthfirst_configdb.validation_rules", [{"rule_id": 900, "business_rule_id": "DQ900"}])
+
+    firsts = []
+    def reserve():
+        firsts.append(allocate_rule_ids(engine, 10))
+
+    threads = [threading.Thread(target=reserve) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(firsts) == list(range(901, 981, 10))
+
+
+def test_unmerged_changelog_ids_are_skipped(engine, data_folder):
+    insert_rows(engine, "healthfirst_configdb.validation_rules", [{"rule_id": 900, "business_rule_id": "DQ900"}])
+    _write_changelog(data_folder, "load_validation_rules_data_ver_1_0_1.csv", [950, 951])
+    assert allocate_rule_ids(engine, 2) == 952
+
+    # A changelog rewritten with more rows is read again
+    _write_changelog(data_folder, "load_validation_rules_data_ver_1_0_1.csv", [950, 951, 952, 953, 970])
+    assert allocate_rule_ids(engine, 1) == 971
+    # Other CSVs in the folder are not changelogs
+    _write_changelog(data_folder, "notes.csv", [5000])
+    assert allocate_rule_ids(engine, 1) == 972
+
+
+def test_failed_run_gives_its_ids_back(engine, data_folder):
+    insert_rows(engine, "healthfirst_configdb.validation_rules", [{"rule_id": 900, "business_rule_id": "DQ900"}])
+
+    with pytest.raises(RuntimeError):
+        with id_reservations():
+            assert allocate_rule_ids(engine, 2) == 901
+            raise RuntimeError("CSV not written")
+
+    with id_reservations() as reservations:
+        assert allocate_rule_ids(engine, 2) == 901
+        reservations.keep()
+
+    assert allocate_rule_ids(engine, 1) == 903
+
+
+def test_release_keeps_blocks_handed_out_later(engine, data_folder):
+    later = []
+    with pytest.raises(RuntimeError):
+        with id_reservations():
+            assert allocate_rule_ids(engine, 2) == 1
+            assert allocate_rule_ids(engine, 3) == 3
+            raise RuntimeError("CSV not written")
+    assert allocate_rule_ids(engine, 1) == 1
+
+    with pytest.raises(RuntimeError):
+        with id_reservations():
+            allocate_rule_ids(engine, 2)
+            # Another submission reserves on top before this one fails
+            worker = threading.Thread(target=lambda: later.append(allocate_rule_ids(engine, 1)))
+            worker.start()
+            worker.join()
+            raise RuntimeError("CSV not written")
+
+    assert later == [4]
+    assert allocate_rule_ids(engine, 1) == 5
+
+
+def test_released_hrp_block_lowers_the_overall_counter(engine, data_folder):
+    with pytest.raises(RuntimeError):
+        with id_reservations():
+            assert allocate_rule_extn_ids(engine, "healthfirst", 2, 3) == (1, 3)
+            raise RuntimeError("CSV not written")
+
+    assert allocate_rule_extn_ids(engine, "healthfirst", 1, 1) == (1, 2)
+
+
+def test_counters_are_kept_per_database(engine, data_folder, tmp_path):
+    other = create_sqlite_engine(str(tmp_path / "other"), configdb_schemas(TENANTS))
+    try:
+        with other.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE TABLE healthfirst_configdb.validation_rules (rule_id INTEGER, business_rule_id TEXT)"
+            )
+        assert allocate_rule_ids(engine, 5) == 1
+        assert allocate_rule_ids(other, 5) == 1
+        assert allocate_rule_ids(engine, 1) == 6
+    finally:
+        other.dispose()
+
+
+def test_ids_committed_elsewhere_are_seen_on_the_next_reservation(engine, data_folder):
+    insert_rows(engine, "healthfirst_configdb.validation_rules", [{"rule_id": 900, "business_rule_id": "DQ900"}])
+    assert allocate_rule_ids(engine, 1) == 901
+
+    # Another machine deploys rules; there is no changelog for them in the local data folder
+    insert_rows(engine, "healthfirst_configdb.validation_rules", [{"rule_id": 950, "business_rule_id": "DQ950"}])
+    assert allocate_rule_ids(engine, 1) == 951
+
+
+def _write_lock(token, age_seconds=0):
+    lock_path = f"{id_allocator.ID_LEDGER_PATH}.lock"
+    with open(lock_path, "w", encoding="utf-8") as f:
+        f.write(token)
+    if age_seconds:
+        stamp = time.time() - age_seconds
+        os.utime(lock_path, (stamp, stamp))
+    return lock_path
+
+
+def test_lock_of_a_live_holder_is_not_broken(engine, data_folder, monkeypatch):
+    monkeypatch.setattr(id_allocator, "ID_LEDGER_LOCK_TIMEOUT_SECONDS", 0.05)
+    lock_path = _write_lock(f"{socket.gethostname()} {os.getpid()} other-holder")
+
+    firsts = []
+    worker = threading.Thread(target=lambda: firsts.append(allocate_rule_ids(engine, 1)))
+    worker.start()
+    worker.join(0.5)
+    assert worker.is_alive()
+    assert os.path.exists(lock_path)
+
+    os.remove(lock_path)
+    worker.join(5)
+    assert firsts == [1]
+
+
+def test_lock_of_an_exited_holder_is_taken_over(engine, data_folder, monkeypatch):
+    monkeypatch.setattr(id_allocator, "ID_LEDGER_LOCK_TIMEOUT_SECONDS", 0.05)
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    lock_path = _write_lock(f"{socket.gethostname()} {finished.pid} crashed-holder")
+
+    assert allocate_rule_ids(engine, 1) == 1
+    assert not os.path.exists(lock_path)
+    assert not [name for name in os.listdir(os.path.dirname(lock_path)) if name.endswith(".stale")]
+
+
+def test_old_lock_from_another_host_is_taken_over(engine, data_folder, monkeypatch):
+    monkeypatch.setattr(id_allocator, "ID_LEDGER_LOCK_TIMEOUT_SECONDS", 0.05)
+    _write_lock("other-host 1 remote-holder", age_seconds=id_allocator.ID_LEDGER_LOCK_STALE_SECONDS + 60)
+
+    assert allocate_rule_ids(engine, 1) == 1
+
+
+def test_holder_only_removes_its_own_lock(data_folder):
+    lock_path = f"{id_allocator.ID_LEDGER_PATH}.lock"
+    with id_allocator._file_lock(lock_path):
+        # Broken by another waiter, which now holds a lock of its own
+        _write_lock(f"{socket.gethostname()} {os.getpid()} new-holder")
+
+    assert id_allocator._read_lock(lock_path).endswith("new-holder")
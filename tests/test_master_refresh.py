@@ -0,0 +1,81 @@
+import zipfile
+from rules.master_refresh import sheet_fingerprints
+
+SHEETS = ["Provider Network", "Practitioner"]
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+WORKBOOK = (
+    f'<workbook xmlns="{MAIN_NS}" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+    '<sheet name="Provider Network" sheetId="1" r:id="rId1"/><sheet name="Practitioner" sheetId="2" r:id="rId2"/>'
+    '</sheets></workbook>'
+)
+RELS = (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/><Relationship Id="rId2" Target="worksheets/sheet2.xml"/>'
+    '</Relationships>'
+)
+
+
+def _styles(date_format):
+    return (
+        f'<styleSheet xmlns="{MAIN_NS}"><numFmts><numFmt numFmtId="164" formatCode="{date_format}"/></numFmts>'
+        '<cellXfs><xf numFmtId="0"/><xf numFmtId="164"/></cellXfs></styleSheet>'
+    )
+
+
+def _sheet(cells):
+    # cells: (ref, shared string index) or (ref, serial, style index)
+    xml = []
+    for cell in cells:
+        if len(cell) == 2:
+            xml.append(f'<c r="{cell[0]}" t="s"><v>{cell[1]}</v></c>')
+        else:
+            xml.append(f'<c r="{cell[0]}" s="{cell[2]}"><v>{cell[1]}</v></c>')
+    return f'<worksheet xmlns="{MAIN_NS}"><sheetData><row r="1">{"".join(xml)}</row></sheetData></worksheet>'
+
+
+def _write_workbook(path, strings, sheet1, sheet2, date_format="yyyy-mm-dd"):
+    shared = "".join(f"<si><t>{text}</t></si>" for text in strings)
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("xl/workbook.xml", WORKBOOK)
+        archive.writestr("xl/_rels/workbook.xml.rels", RELS)
+        archive.writestr("xl/sharedStrings.xml", f'<sst xmlns="{MAIN_NS}">{shared}</sst>')
+        archive.writestr("xl/styles.xml", _styles(date_format))
+        archive.writestr("xl/worksheets/sheet1.xml", _sheet(sheet1))
+        archive.writestr("xl/worksheets/sheet2.xml", _sheet(sheet2))
+
+
+def _original(path, **kwargs):
+    _write_workbook(
+        path, ["DQ1", "First rule", "DQ2", "Second rule"],
+        [("A1", 0), ("B1", 1)], [("A1", 2), ("B1", 3), ("C1", 45323, 1)], **kwargs
+    )
+
+
+def test_one_cell_edit_only_changes_its_own_sheet(tmp_path):
+    path = str(tmp_path / "master.xlsx")
+    _original(path)
+    before = sheet_fingerprints(path, SHEETS)
+
+    # The edited string is written first, renumbering every string the second sheet points at
+    _write_workbook(
+        path, ["DQ1", "Edited first rule", "First rule", "DQ2", "Second rule"],
+        [("A1", 0), ("B1", 1)], [("A1", 3), ("B1", 4), ("C1", 45323, 1)]
+    )
+    after = sheet_fingerprints(path, SHEETS)
+
+    assert set(before) == set(SHEETS)
+    assert after[SHEETS[0]] != before[SHEETS[0]]
+    assert after[SHEETS[1]] == before[SHEETS[1]]
+
+
+def test_number_format_change_is_detected(tmp_path):
+    path = str(tmp_path / "master.xlsx")
+    _original(path)
+    before = sheet_fingerprints(path, SHEETS)
+
+    _original(path, date_format="0.00")
+    after = sheet_fingerprints(path, SHEETS)
+
+    assert after[SHEETS[0]] == before[SHEETS[0]]
+    assert after[SHEETS[1]] != before[SHEETS[1]]
@@ -0,0 +1,35 @@
+import pandas as pd
+from rules.configure import _count_new_configs
+from rules.helper import select_master_rules
+from rules.master_store import open_master_store
+
+
+def _master():
+    return pd.DataFrame({
+        "RuleID": ["DQ1", "DQ2", "DQ1", "DQ3"],
+        "SourceSheet": ["Practitioner", "Practitioner", "Address", "Address"],
+        "Entity": ["Practitioner", "Practitioner", "Address", "Address"],
+    })
+
+
+def test_configure_counts_work_against_the_store(tmp_path):
+    workbook = tmp_path / "master.xlsx"
+    workbook.write_bytes(b"master")
+    store = open_master_store(str(workbook), lambda path: _master())
+
+    config_df = pd.DataFrame({"ruleid": ["DQ1", "DQ2", "DQ9"], "sourceownername": ["hrp", "abc", "hrp"]})
+    db_rule_ids = {"DQ1": 1, "DQ2": 2, "DQ9": 9}
+
+    # prepare_configure_rules swaps the store for the requested rules before counting
+    master_rules = select_master_rules(store, config_df["ruleid"].tolist())
+    assert _count_new_configs(master_rules, config_df, db_rule_ids, {}) == (1, 1)
+
+
+def test_store_returns_first_occurrence_of_requested_rules(tmp_path):
+    workbook = tmp_path / "master.xlsx"
+    workbook.write_bytes(b"master")
+    store = open_master_store(str(workbook), lambda path: _master())
+
+    rules = store.fetch_rules(["DQ3", "DQ1", "NOPE"])
+    assert rules["RuleID"].tolist() == ["DQ1", "DQ3"]
+    assert rules["SourceSheet"].tolist() == ["Practitioner", "Address"]
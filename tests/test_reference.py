@@ -0,0 +1,27 @@
+from conftest import insert_rows
+from rules.helper import RULE_EXTN_COLUMNS
+from rules.reference import TenantReferenceSnapshot
+
+
+def _extn(rule_extn_id, source_owner_name, source_table_id):
+    row = {column: None for column in RULE_EXTN_COLUMNS}
+    row.update({
+        "rule_extn_id": rule_extn_id,
+        "rule_id": rule_extn_id,
+        "source_owner_name": source_owner_name,
+        "source_table_id": source_table_id,
+    })
+    return row
+
+
+def test_source_table_ids_render_as_integers_despite_nulls(engine):
+    insert_rows(engine, "healthfirst_configdb.des_validation_rules_extn", [
+        _extn(1, "ABC", 77),
+        _extn(2, "ABC", 78),
+        _extn(3, "XYZ", None),
+        _extn(4, "XYZ", 90),
+    ])
+
+    snapshot = TenantReferenceSnapshot("healthfirst")
+    assert sorted(snapshot.get_source_table_id(engine, "abc").split(",")) == ["77", "78"]
+    assert snapshot.get_source_table_id(engine, "XYZ") == "90"
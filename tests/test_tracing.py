@@ -0,0 +1,31 @@
+import json
+import os
+from rules import tracing
+from rules.tracing import trace_run, span
+
+
+def test_timing_file_goes_to_the_timings_dir(tmp_path, monkeypatch):
+    data_folder = tmp_path / "data"
+    data_folder.mkdir()
+    timings_dir = tmp_path / "timings"
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", True)
+    monkeypatch.setattr(tracing, "TIMINGS_DIR", str(timings_dir))
+
+    csv_file = str(data_folder / "load_validation_rules_data_ver_1_0_1.csv")
+    with trace_run("add_update", rules=2) as trace:
+        with span("join_master"):
+            pass
+        for rule_id in ("DQ1", "DQ2"):
+            with span("rule", rule_id=rule_id):
+                pass
+        timing_path = trace.finish([csv_file], "DQ-12/3")
+
+    assert os.listdir(data_folder) == []
+    assert os.path.dirname(timing_path) == str(timings_dir)
+    assert os.path.basename(timing_path).startswith("add_update_DQ-12_3_")
+
+    with open(timing_path, encoding="utf-8") as f:
+        timing = json.load(f)
+    assert timing["files"] == [csv_file]
+    assert timing["summary"]["rule"]["count"] == 2
+    assert [child["name"] for child in timing["trace"]["children"]] == ["join_master", "rule", "rule"]